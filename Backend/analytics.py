@@ -0,0 +1,164 @@
+'''
+Adherence rollups. adherence_daily holds one row per user, day and reminder with the number of
+Verified, Missed and Not Verified logs, so the reports read O(days) rows instead of scanning
+reminder_log.
+
+apply_rows() adds freshly written logs to it in the same transaction as the insert (main.py
+calls it from the log writer), rebuild() recomputes it from reminder_log. Logs written while a
+rebuild runs may be counted twice or not at all, so rebuild while the server is quiet:
+
+    python analytics.py rebuild             # every user
+    python analytics.py rebuild --uid 7
+'''
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import select, text
+
+from models import Adherence_Daily, Medicine_Reminder
+
+# reminder_log status -> adherence_daily column
+STATUS_COLUMNS = {"Verified": "verified", "Missed": "missed", "Not Verified": "not_verified"}
+COUNT_COLUMNS = tuple(STATUS_COLUMNS.values())
+
+
+def _upsert(conn):
+    table = Adherence_Daily.__table__
+    if conn.dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table)
+        return statement.on_duplicate_key_update(
+            {column: table.c[column] + statement.inserted[column] for column in COUNT_COLUMNS})
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=["uid", "day", "rid"],
+        set_={column: table.c[column] + statement.excluded[column] for column in COUNT_COLUMNS})
+
+
+def apply_rows(conn, rows):
+    '''Add reminder_log row dicts (status, rid, uid, date) to the rollup, the caller commits.'''
+    deltas = defaultdict(lambda: dict.fromkeys(COUNT_COLUMNS, 0))
+    for row in rows:
+        column = STATUS_COLUMNS.get(row.get("status"))
+        if column is None or row.get("uid") is None or row.get("rid") is None or row.get("date") is None:
+            continue # no day or no reminder to count it under, rebuild() skips the same rows
+        deltas[(int(row["uid"]), row["date"], int(row["rid"]))][column] += 1
+    if deltas:
+        conn.execute(_upsert(conn), [dict(counts, uid=uid, day=day, rid=rid)
+                                     for (uid, day, rid), counts in deltas.items()])
+    return len(deltas)
+
+
+def rebuild(conn, uid=None):
+    '''Recompute the rollup from reminder_log, for one user or everyone. Returns the rows written.'''
+    where = "uid = :uid" if uid is not None else "1 = 1"
+    params = {"uid": uid} if uid is not None else {}
+    conn.execute(text(f"DELETE FROM adherence_daily WHERE {where}"), params)
+    sums = ", ".join(f"SUM(CASE WHEN status = '{status}' THEN 1 ELSE 0 END)"
+                     for status in STATUS_COLUMNS)
+    result = conn.execute(text(
+        f"INSERT INTO adherence_daily (uid, day, rid, {', '.join(COUNT_COLUMNS)}) "
+        f"SELECT uid, date, rid, {sums} FROM reminder_log "
+        f"WHERE {where} AND uid IS NOT NULL AND rid IS NOT NULL AND date IS NOT NULL "
+        f"GROUP BY uid, date, rid"), params)
+    return result.rowcount
+
+
+def _percentage(verified, total):
+    return round(100.0 * verified / total, 1) if total else None
+
+
+def summary(session, uid, days=30, streak_days=365, today=None):
+    '''
+    Adherence of one user over the last days days: totals, one entry per day, one per reminder
+    (with its medicine names), the current streak and this week against the week before.
+    '''
+    today = today or date.today()
+    lookback = max(days, streak_days, 14)
+    rows = session.execute(select(Adherence_Daily).where(
+        Adherence_Daily.uid == uid, Adherence_Daily.day > today - timedelta(days=lookback),
+        Adherence_Daily.day <= today)).scalars().all()
+
+    by_day = defaultdict(lambda: dict.fromkeys(COUNT_COLUMNS, 0))
+    by_rid = defaultdict(lambda: dict.fromkeys(COUNT_COLUMNS, 0))
+    first_day = today - timedelta(days=days - 1)
+    for row in rows:
+        for column in COUNT_COLUMNS:
+            by_day[row.day][column] += getattr(row, column)
+            if row.day >= first_day:
+                by_rid[row.rid][column] += getattr(row, column)
+
+    def day_entry(day):
+        counts = by_day.get(day, dict.fromkeys(COUNT_COLUMNS, 0))
+        return dict(counts, day=day.isoformat(), percentage=_percentage(counts["verified"], sum(counts.values())))
+
+    daily = [day_entry(first_day + timedelta(days=i)) for i in range(days)]
+    totals = {column: sum(entry[column] for entry in daily) for column in COUNT_COLUMNS}
+
+    # Days in a row, back from today, with a verified dose and nothing missed. Today does not
+    # break the streak while its doses may still be ahead.
+    streak, day = 0, today
+    while day > today - timedelta(days=lookback):
+        counts = by_day.get(day)
+        clean = counts is not None and counts["verified"] and not counts["missed"] and not counts["not_verified"]
+        if not clean:
+            if day != today or (counts is not None and (counts["missed"] or counts["not_verified"])):
+                break
+        else:
+            streak += 1
+        day -= timedelta(days=1)
+
+    def week(ending):
+        counts = [by_day.get(ending - timedelta(days=i)) for i in range(7)]
+        verified = sum(c["verified"] for c in counts if c)
+        return _percentage(verified, sum(sum(c.values()) for c in counts if c))
+
+    current, previous = week(today), week(today - timedelta(days=7))
+    change = round(current - previous, 1) if current is not None and previous is not None else None
+
+    names = defaultdict(list)
+    if by_rid:
+        for rid, mname in session.execute(select(Medicine_Reminder.rid, Medicine_Reminder.mname).where(
+                Medicine_Reminder.rid.in_(list(by_rid)))):
+            names[rid].append(mname)
+    reminders = [dict(counts, rid=rid, medicines=names.get(rid, []),
+                      percentage=_percentage(counts["verified"], sum(counts.values())))
+                 for rid, counts in sorted(by_rid.items())]
+
+    return {
+        "uid": uid,
+        "days": days,
+        "totals": dict(totals, percentage=_percentage(totals["verified"], sum(totals.values()))),
+        "streak": streak,
+        "trend": {
+            "this_week": current,
+            "last_week": previous,
+            "change": change,
+            "direction": None if change is None else ("up" if change > 0 else "down" if change < 0 else "flat"),
+        },
+        "daily": daily,
+        "reminders": reminders,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = sub.add_parser("rebuild", help="recompute adherence_daily from reminder_log")
+    rebuild_parser.add_argument("--uid", type=int, default=None, help="only this user")
+    args = parser.parse_args()
+
+    from main import app, db
+    with app.app_context():
+        with db.engine.begin() as conn:
+            written = rebuild(conn, args.uid)
+        print(f"Rebuilt {written} adherence_daily rows" + (f" for uid {args.uid}" if args.uid is not None else ""))
+
+
+if __name__ == "__main__":
+    main()
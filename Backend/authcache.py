@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _User:
+    __slots__ = ("exists", "rids", "expires")
+
+    def __init__(self, exists, expires):
+        self.exists = exists
+        self.rids = None # frozenset of the user's reminder ids, loaded on the first ownership check
+        self.expires = expires
+
+
+def _key(uid):
+    # uids come from JSON bodies and query strings, as ints or strings
+    try:
+        return int(uid)
+    except (TypeError, ValueError):
+        return None
+
+
+class UserCache:
+    '''
+    Bounded LRU with a TTL in front of the "does this user exist" and "is this their reminder"
+    checks every REST endpoint and socket handler makes.
+
+    load_user(uid) -> bool and load_rids(uid) -> iterable of rids do the database reads.
+    Unknown uids are cached too (negative_ttl, shorter) so a client retrying with a bad uid
+    does not hit the database every time. A rid that is not in the cached set is re-read once
+    before saying no, so a reminder another process just created is never refused, while the
+    common case, a rid that is there, never leaves memory.
+
+    Writes in this process call invalidate() (main.py hooks the User and Reminder model events),
+    other processes catch up when the entry expires.
+    '''
+
+    def __init__(self, load_user, load_rids, max_entries=4096, ttl=60.0, negative_ttl=5.0, clock=time.monotonic):
+        self.load_user = load_user
+        self.load_rids = load_rids
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self._entries = OrderedDict() # uid -> _User, least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+        self.rid_reloads = 0
+
+    def _entry(self, key):
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                if not entry.exists:
+                    self.negative_hits += 1
+                return entry
+            self.misses += 1
+        # Read outside the lock, two concurrent misses for one uid both query, which is harmless
+        exists = bool(self.load_user(key))
+        entry = _User(exists, now + (self.ttl if exists else self.negative_ttl))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def exists(self, uid):
+        key = _key(uid)
+        if key is None:
+            return False
+        return self._entry(key).exists
+
+    def owns(self, uid, rid):
+        '''True when the user exists and rid is one of their reminders.'''
+        key, rid = _key(uid), _key(rid)
+        if key is None or rid is None:
+            return False
+        entry = self._entry(key)
+        if not entry.exists:
+            return False
+        if entry.rids is not None and rid in entry.rids:
+            return True
+        if entry.rids is not None:
+            self.rid_reloads += 1
+        entry.rids = frozenset(self.load_rids(key))
+        return rid in entry.rids
+
+    def invalidate(self, uid):
+        with self._lock:
+            self._entries.pop(_key(uid), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "rid_reloads": self.rid_reloads,
+        }
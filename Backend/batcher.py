@@ -0,0 +1,131 @@
+import threading
+import time
+
+
+class _PendingFrame:
+    __slots__ = ("item", "submitted", "deadline", "done", "result", "error")
+
+    def __init__(self, item, budget):
+        self.item = item
+        self.submitted = time.monotonic()
+        self.deadline = self.submitted + budget
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceBatcher:
+    '''
+    Collects frames from every active sid and runs them through the model as one batch.
+
+    A batch is flushed as soon as one of these is true:
+      - it holds max_batch frames
+      - every session that is currently processing has submitted its frame (expected_fn)
+      - the collection window has passed since the first frame arrived
+      - the oldest frame has used up its latency budget
+    so a lone user never waits for a batch that will not fill.
+
+    concurrency is how many batches may run at once, 1 when the model runs inline on the
+    hub and the number of worker processes when it runs in an InferencePool.
+    '''
+
+    def __init__(self, predict_fn, max_batch=8, window_ms=20, budget_ms=50, expected_fn=None, concurrency=1, spawn=None):
+        self.predict_fn = predict_fn # takes a list of items, returns a list of results in the same order
+        self.max_batch = max(1, int(max_batch))
+        self.window = window_ms / 1000.0
+        self.budget = budget_ms / 1000.0
+        self.expected_fn = expected_fn
+        self.concurrency = max(1, int(concurrency))
+        self._spawn = spawn
+        self._slots = threading.Semaphore(self.concurrency)
+        self._pending = []
+        self._cond = threading.Condition()
+        self._worker = None
+
+        # simple counters so we can see how well batching works
+        self.batches = 0
+        self.frames = 0
+
+    def _launch(self, target, *args):
+        if self._spawn is None:
+            thread = threading.Thread(target=target, args=args, daemon=True)
+            thread.start()
+            return thread
+        # e.g. socketio.start_background_task
+        return self._spawn(target, *args)
+
+    def start(self):
+        '''Start the flush loop, predict() calls this on first use.'''
+        if self._worker is None:
+            self._worker = self._launch(self._run)
+
+    def predict(self, item, budget_ms=None):
+        '''Queue one item and block the calling greenlet until its result is ready.'''
+        self.start()
+        budget = self.budget if budget_ms is None else budget_ms / 1000.0
+        pending = _PendingFrame(item, budget)
+        with self._cond:
+            self._pending.append(pending)
+            self._cond.notify()
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ready(self):
+        if len(self._pending) >= self.max_batch:
+            return True
+        if self.expected_fn is not None:
+            # Every busy session has handed in its frame, nothing else can join this batch
+            return len(self._pending) >= self.expected_fn()
+        return False
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            flush_at = self._pending[0].submitted + self.window
+            flush_at = min(flush_at, min(p.deadline for p in self._pending))
+            while not self._ready():
+                remaining = flush_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+                if self._pending:
+                    flush_at = min(flush_at, self._pending[-1].deadline)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            return batch
+
+    def _run(self):
+        while True:
+            # Wait for a free slot first so frames keep joining the batch while the previous ones run
+            self._slots.acquire()
+            batch = self._next_batch()
+            if self.concurrency == 1:
+                self._run_batch(batch)
+            else:
+                self._launch(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        try:
+            results = self.predict_fn([p.item for p in batch])
+            for p, result in zip(batch, results):
+                p.result = result
+        except Exception as e:
+            for p in batch:
+                p.error = e
+        finally:
+            self.batches += 1
+            self.frames += len(batch)
+            for p in batch:
+                p.done.set()
+            self._slots.release()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "frames": self.frames,
+            "avg_batch_size": (self.frames / self.batches) if self.batches else 0.0,
+            "pending": len(self._pending),
+        }
@@ -0,0 +1,235 @@
+'''
+Replays recorded frames through the vision pipeline (vision.run_frames plus the OCR stage's
+read_batch), with no socket and no server, and reports per stage timings and throughput.
+
+    python bench_vision.py                                   # 300 synthetic frames, stub models
+    python bench_vision.py --frames recorded/ --loops 3
+    python bench_vision.py --video session.mp4 --batch 4
+    python bench_vision.py --frames recorded/ --engine onnx --model custom.onnx --ocr easyocr
+    python bench_vision.py --stub-predict-ms 25 --stub-ocr-ms 40 --json after.json
+
+With the stub models (the default) nothing needs the weights or a GPU, the numbers then cover
+decode, crop, annotate and encode exactly and predict / OCR as the configured sleep, so two
+runs of the same command on the same box can be compared before and after a pipeline change.
+--json writes the report for such a comparison.
+'''
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import time
+
+import cv2
+import numpy as np
+
+import engines
+import ocr
+import vision
+
+STAGES = ("decode", "predict", "crop", "ocr", "annotate", "encode")
+
+
+def load_directory(folder):
+    paths = sorted(p for pattern in ("*.jpg", "*.jpeg", "*.png") for p in glob.glob(os.path.join(folder, pattern)))
+    frames = []
+    for path in paths:
+        if path.lower().endswith(".png"):
+            ok, buf = cv2.imencode(".jpg", cv2.imread(path))
+            if ok:
+                frames.append(buf.tobytes())
+        else:
+            with open(path, "rb") as f:
+                frames.append(f.read()) # recorded JPEGs are replayed byte for byte
+    return frames
+
+
+def load_video(path, quality, limit=None):
+    capture = cv2.VideoCapture(path)
+    frames = []
+    while limit is None or len(frames) < limit:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if ok:
+            frames.append(buf.tobytes())
+    capture.release()
+    return frames
+
+
+def synthetic_frames(count, size, quality, seed):
+    '''A label and a face-sized blob drifting over a noisy background, like a hand held phone.'''
+    rng = random.Random(seed)
+    h, w = int(size * 0.75), size
+    base = np.random.default_rng(seed).integers(60, 120, (h, w, 3), dtype=np.uint8)
+    frames, dx, dy = [], 0, 0
+    for _ in range(count):
+        dx = max(-20, min(20, dx + rng.randint(-3, 3)))
+        dy = max(-20, min(20, dy + rng.randint(-3, 3)))
+        frame = base.copy()
+        x, y = int(w * 0.18) + dx, int(h * 0.35) + dy
+        cv2.rectangle(frame, (x, y), (x + int(w * 0.25), y + int(h * 0.45)), (235, 235, 235), -1)
+        cv2.putText(frame, "PARACETAMOL", (x + 5, y + int(h * 0.2)), cv2.FONT_HERSHEY_SIMPLEX, size / 1600.0, (20, 20, 20), 2)
+        cv2.circle(frame, (int(w * 0.72) - dx, int(h * 0.3) + dy), int(h * 0.12), (120, 150, 200), -1)
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        frames.append(buf.tobytes())
+    return frames
+
+
+def percentile(values, q):
+    # Nearest rank, so p99 of a short run is a value that actually happened
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100.0 * len(ordered)) - 1)]
+
+
+def describe(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def load_models(args):
+    if args.engine == "stub":
+        detector = engines.StubDetector(predict_ms=args.stub_predict_ms, frame_ms=args.stub_frame_ms)
+    elif args.engine == "onnx":
+        detector = engines.load_detector("onnx", args.model, threads=args.threads)
+    else:
+        detector = engines.load_detector("torch", args.model)
+    if args.ocr == "stub":
+        reader = ocr.StubReader(delay_ms=args.stub_ocr_ms)
+    else:
+        reader = ocr.load_reader(gpu=False)
+    return detector, reader
+
+
+def replay(frames, detector, reader, args):
+    '''One pass over frames the way a single session sends them, returns timings per stage.'''
+    cache = ocr.OcrCache()
+    timings = {}
+    frame_ms = [] # run_frames wall time, what the frame reply waits for, given to every frame of its batch
+    counter = 0
+    started = time.perf_counter()
+    for start in range(0, len(frames), args.batch):
+        jobs = []
+        for buf in frames[start:start + args.batch]:
+            counter += 1
+            run_ocr = counter % args.ocr_every == 0
+            jobs.append(vision.FrameJob(buf, run_ocr, "PARACETAMOL", not args.no_annotate, None,
+                                        cache.snapshot() if run_ocr else None))
+        batch_start = time.perf_counter()
+        results = vision.run_frames(detector, jobs, conf=args.conf, timings=timings)
+        frame_ms += [(time.perf_counter() - batch_start) * 1000] * len(jobs)
+
+        # What the OcrStage would do with the misses, timed as one EasyOCR call per batch
+        misses = [read for result in results for read in result.ocr if not read.cached and read.crop is not None]
+        for result in results:
+            for read in result.ocr:
+                if read.cached:
+                    cache.record(read)
+        if misses:
+            ocr_start = time.perf_counter()
+            texts = ocr.read_batch(reader, [read.crop for read in misses], mode=args.ocr_mode, height=args.ocr_height)
+            timings.setdefault("ocr", []).append((time.perf_counter() - ocr_start) * 1000)
+            for read, read_texts in zip(misses, texts):
+                cache.record(ocr.OcrRead(read_texts, read.fingerprint, False))
+    wall = time.perf_counter() - started
+    return timings, frame_ms, wall, cache.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--frames", help="folder of recorded frames (jpg/png)")
+    source.add_argument("--video", help="video file, every frame is JPEG encoded at --quality first")
+    source.add_argument("--synthetic", type=int, default=300, help="generated frames when no recording is given")
+    parser.add_argument("--size", type=int, default=640, help="width of synthetic frames")
+    parser.add_argument("--quality", type=int, default=40, help="JPEG quality for synthetic and video frames")
+    parser.add_argument("--limit", type=int, default=None, help="use at most this many frames")
+    parser.add_argument("--loops", type=int, default=1, help="replay the frames this many times")
+    parser.add_argument("--warmup", type=int, default=5, help="frames run first and left out of the numbers")
+    parser.add_argument("--batch", type=int, default=1, help="frames per run_frames call, like INFERENCE_MAX_BATCH")
+    parser.add_argument("--engine", choices=engines.ENGINES, default="stub")
+    parser.add_argument("--model", default="custom.pt")
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime intra-op threads")
+    parser.add_argument("--conf", type=float, default=0.5)
+    parser.add_argument("--ocr", choices=("stub", "easyocr"), default="stub")
+    parser.add_argument("--ocr-mode", choices=ocr.OCR_MODES, default="detect")
+    parser.add_argument("--ocr-height", type=int, default=96)
+    parser.add_argument("--ocr-every", type=int, default=10, help="like OCR_EVERY_N_FRAMES")
+    parser.add_argument("--no-annotate", action="store_true", help="metadata overlay clients, no annotate/encode")
+    parser.add_argument("--stub-predict-ms", type=float, default=0.0, help="stub detector cost per call")
+    parser.add_argument("--stub-frame-ms", type=float, default=0.0, help="stub detector cost per frame")
+    parser.add_argument("--stub-ocr-ms", type=float, default=0.0, help="stub OCR cost per call")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    args.batch = max(1, args.batch)
+    args.ocr_every = max(1, args.ocr_every)
+
+    if args.frames:
+        frames, origin = load_directory(args.frames), args.frames
+    elif args.video:
+        frames, origin = load_video(args.video, args.quality, args.limit), args.video
+    else:
+        frames, origin = synthetic_frames(args.synthetic, args.size, args.quality, args.seed), "synthetic"
+    frames = frames[:args.limit]
+    if not frames:
+        raise SystemExit(f"No frames in {origin}")
+
+    detector, reader = load_models(args)
+    if args.warmup:
+        warmup_args = argparse.Namespace(**dict(vars(args), batch=1))
+        replay(frames[:args.warmup], detector, reader, warmup_args)
+
+    timings, frame_ms, wall = {}, [], 0.0
+    for _ in range(args.loops):
+        loop_timings, loop_frame_ms, loop_wall, cache_stats = replay(frames, detector, reader, args)
+        for stage, values in loop_timings.items():
+            timings.setdefault(stage, []).extend(values)
+        frame_ms += loop_frame_ms
+        wall += loop_wall
+
+    total = len(frames) * args.loops
+    report = {
+        "source": origin,
+        "frames": total,
+        "engine": args.engine,
+        "ocr": args.ocr,
+        "batch": args.batch,
+        "throughput_fps": total / wall if wall else None,
+        "frame_ms": describe(frame_ms),
+        "stages": {stage: describe(timings.get(stage, [])) for stage in STAGES},
+        "ocr_cache": cache_stats,
+    }
+
+    print(f"{total} frames from {origin}, engine {args.engine}, OCR {args.ocr}, batch {args.batch}")
+    print(f"\n{'stage':10} {'count':>6} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for stage in STAGES + ("frame",):
+        stats = report["frame_ms"] if stage == "frame" else report["stages"][stage]
+        if not stats["count"]:
+            print(f"{stage:10} {0:>6}")
+            continue
+        print(f"{stage:10} {stats['count']:>6} {stats['mean']:8.2f} {stats['p50']:8.2f} "
+              f"{stats['p95']:8.2f} {stats['p99']:8.2f} {stats['max']:8.2f}")
+    print(f"\nthroughput {report['throughput_fps']:.1f} frames/s (one session, OCR inline)"
+          f", OCR cache hit rate {cache_stats['hit_rate']:.2f}")
+    print("predict and ocr count once per call, frame is the run_frames time of the frame's batch")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+'''
+State that has to agree across every node when main.py runs as more than one process behind a
+load balancer, kept in a small key-value backend:
+
+    VerificationLock  the is_logged lock, per (uid, rid, day) instead of per sid
+    ScanProgress      the medicine name a scan has confirmed, so a client that reconnects
+                      (possibly to another node) carries on instead of reading the label again
+    Presence          uid -> sids connected anywhere, for emits the server starts itself
+
+The per frame state (tracker, OCR cache, dedupe gate, pacing, the busy flag) stays in each
+node's SessionStore. A Socket.IO connection lives on one node for its whole life (websocket,
+or polling with sticky routing), so only that node ever reads it, and it is far too hot to
+send over the network every frame. Emits to a sid on another node go through Flask-SocketIO's
+message queue (SOCKETIO_MESSAGE_QUEUE in main.py), frame replies skip it since their sid is local.
+
+Backends, picked by STATE_BACKEND:
+
+    memory              this process only, the default
+    redis://host:6379/0 shared by every node (pip install redis)
+    local://host:6390   a localhub.py process, a stand-in for Redis to try several nodes on one
+                        machine (twonode.py does), it also serves as SOCKETIO_MESSAGE_QUEUE
+
+Consistency of the verification lock:
+
+- acquire() is one atomic set-if-absent (SET NX PX on Redis), so for a given uid, rid and day
+  at most one session on any node logs Verified, whichever frame gets there first. The others
+  are told verified with log "already" and write nothing.
+- The lock is taken before the row is queued. If the row is rejected or fails, release()
+  deletes the key only if this node still holds it, and the next frame (anywhere) tries again.
+  A node dying between the two leaves the lock without a row until it expires, the dose then
+  reads as not taken, the same as a phone that dies mid scan.
+- state.is_logged stays as the session's local copy, once set the session never asks again.
+- If the backend cannot be reached the lock fails open: the dose is logged, each session still
+  only logs once, but two nodes may both log it. A duplicate Verified row is easier to explain
+  to a caregiver than a verification that was refused.
+- Redis replication is asynchronous, a failover right after an acquire can lose the key, with
+  the same outcome as the backend being down.
+'''
+import json
+import threading
+import time
+
+
+class MemoryBackend:
+    '''Dict with expiry, the same operations as RedisBackend.'''
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._data = {} # key -> [value, expires or None], value is a str or a set
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self.swept = 0
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def _expires(self, ttl, now):
+        return now + ttl if ttl else None
+
+    def sweep(self):
+        '''Drop the expired keys nobody reads again (a claimed dose, a sid list), how many.'''
+        now = self.clock()
+        with self._lock:
+            expired = [key for key, (_, expires) in self._data.items() if expires is not None and expires <= now]
+            for key in expired:
+                del self._data[key]
+        self.swept += len(expired)
+        return len(expired)
+
+    def start_sweeper(self, spawn, sleep, interval=60):
+        '''Run sweep every `interval` seconds, reads only expire the keys they touch.'''
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while True:
+                sleep(interval)
+                self.sweep()
+
+        self._sweeper = spawn(run)
+
+    def stats(self):
+        with self._lock:
+            return {"keys": len(self._data), "swept": self.swept}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key, self.clock())
+            return entry[0] if entry is not None else None
+
+    def set(self, key, value, ttl=None):
+        now = self.clock()
+        with self._lock:
+            self._data[key] = [value, self._expires(ttl, now)]
+
+    def add(self, key, value, ttl=None):
+        '''Set key only if it is not there, True when this call set it.'''
+        now = self.clock()
+        with self._lock:
+            if self._live(key, now) is not None:
+                return False
+            self._data[key] = [value, self._expires(ttl, now)]
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_if(self, key, value):
+        '''Delete key only while it still holds value, True when it did.'''
+        with self._lock:
+            entry = self._live(key, self.clock())
+            if entry is None or entry[0] != value:
+                return False
+            del self._data[key]
+            return True
+
+    def sadd(self, key, member, ttl=None):
+        now = self.clock()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry is None:
+                entry = self._data[key] = [set(), None]
+            entry[0].add(member)
+            entry[1] = self._expires(ttl, now)
+
+    def srem(self, key, member):
+        with self._lock:
+            entry = self._live(key, self.clock())
+            if entry is not None:
+                entry[0].discard(member)
+                if not entry[0]:
+                    del self._data[key]
+
+    def smembers(self, key):
+        with self._lock:
+            entry = self._live(key, self.clock())
+            return set(entry[0]) if entry is not None else set()
+
+
+class RedisBackend:
+    # Compare and delete has to be one step, or a lock taken over in between would be dropped
+    _DELETE_IF = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+    def __init__(self, url, prefix="medaware:"):
+        import redis # only needed for a shared backend
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._delete_if = self.client.register_script(self._DELETE_IF)
+
+    def _ms(self, ttl):
+        return int(ttl * 1000) if ttl else None
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, px=self._ms(ttl))
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(self.prefix + key, value, nx=True, px=self._ms(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def delete_if(self, key, value):
+        return bool(self._delete_if(keys=[self.prefix + key], args=[value]))
+
+    def sadd(self, key, member, ttl=None):
+        pipe = self.client.pipeline()
+        pipe.sadd(self.prefix + key, member)
+        if ttl:
+            pipe.pexpire(self.prefix + key, self._ms(ttl))
+        pipe.execute()
+
+    def srem(self, key, member):
+        self.client.srem(self.prefix + key, member)
+
+    def smembers(self, key):
+        return set(self.client.smembers(self.prefix + key))
+
+
+def load_backend(url):
+    if url in (None, "", "memory"):
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    if url.startswith("local://"):
+        from localhub import LocalBackend # test setups only
+        return LocalBackend(url)
+    raise ValueError(f"Unknown state backend {url!r}, expected 'memory', a redis:// or a local:// URL")
+
+
+class VerificationLock:
+    '''One Verified log per uid, rid and day across all nodes, see the module docstring.'''
+
+    def __init__(self, backend, node_id, ttl=36 * 3600):
+        self.backend = backend
+        self.node_id = node_id
+        self.ttl = ttl # past the end of the day the key is for
+        self.acquired = 0
+        self.contended = 0
+        self.errors = 0
+
+    def _key(self, uid, rid, day):
+        return f"verified:{uid}:{rid}:{day.isoformat()}"
+
+    def acquire(self, uid, rid, day):
+        '''True when this caller should log the dose, False when someone already has.'''
+        try:
+            taken = self.backend.add(self._key(uid, rid, day), self.node_id, self.ttl)
+        except Exception:
+            self.errors += 1
+            return True # fail open
+        if taken:
+            self.acquired += 1
+        else:
+            self.contended += 1
+        return taken
+
+    def held(self, uid, rid, day):
+        '''Someone logged (or is logging) Verified for this dose, False if the backend cannot tell.'''
+        try:
+            return self.backend.get(self._key(uid, rid, day)) is not None
+        except Exception:
+            return False
+
+    def release(self, uid, rid, day):
+        try:
+            self.backend.delete_if(self._key(uid, rid, day), self.node_id)
+        except Exception:
+            self.errors += 1
+
+    def stats(self):
+        return {"acquired": self.acquired, "contended": self.contended, "errors": self.errors}
+
+
+class ScanProgress:
+    '''The confirmed medicine name of an unfinished scan, per uid and rid.'''
+
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+
+    def _key(self, uid, rid):
+        return f"scan:{uid}:{rid}"
+
+    def save(self, uid, rid, display_name):
+        try:
+            self.backend.set(self._key(uid, rid), json.dumps({"display_name": display_name}), self.ttl)
+        except Exception:
+            pass # only saves the client a few frames after a reconnect
+
+    def load(self, uid, rid):
+        try:
+            value = self.backend.get(self._key(uid, rid))
+        except Exception:
+            return None
+        return json.loads(value)["display_name"] if value else None
+
+    def clear(self, uid, rid):
+        try:
+            self.backend.delete(self._key(uid, rid))
+        except Exception:
+            pass
+
+
+class Presence:
+    '''Which sids each user has connected, on any node.'''
+
+    def __init__(self, backend, ttl=24 * 3600):
+        self.backend = backend
+        self.ttl = ttl # a node that died without cleaning up is forgotten after this
+
+    def _key(self, uid):
+        return f"sids:{uid}"
+
+    def join(self, uid, sid):
+        try:
+            self.backend.sadd(self._key(uid), sid, self.ttl)
+        except Exception:
+            pass # the socket still works, only server started emits miss it
+
+    def leave(self, uid, sid):
+        try:
+            self.backend.srem(self._key(uid), sid)
+        except Exception:
+            pass
+
+    def sids(self, uid):
+        try:
+            return self.backend.smembers(self._key(uid))
+        except Exception:
+            return set()
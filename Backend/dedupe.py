@@ -0,0 +1,71 @@
+import cv2
+import numpy as np
+
+
+def thumbnail(buf, size=16):
+    '''
+    Tiny grey version of a JPEG. IMREAD_REDUCED_GRAYSCALE_8 makes libjpeg decode at 1/8 scale,
+    which is little more than reading the DC coefficient of every 8x8 block, so this costs a
+    fraction of a full decode.
+    '''
+    img = cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if img is None:
+        return None
+    return cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA)
+
+
+def difference(a, b):
+    # Mean absolute grey level difference, 0..255
+    return float(cv2.absdiff(a, b).mean())
+
+
+class DuplicateGate:
+    '''
+    Per-session check in front of inference. When the phone is held still, consecutive frames
+    are nearly identical, so a frame whose thumbnail is within threshold grey levels of the
+    last processed one gets that frame's result back instead of a decode/predict/annotate pass.
+
+    At most max_skips frames in a row are skipped, so slow drift still gets a real pass.
+    The label (the display_name drawn into an annotated frame) has to match too, otherwise a
+    reused image would show a stale name.
+    '''
+
+    def __init__(self, threshold=2.0, max_skips=10, size=16):
+        self.threshold = threshold
+        self.max_skips = max_skips
+        self.size = size
+        self._thumb = None # of the last processed frame
+        self._candidate = None # of the frame being processed now
+        self._result = None
+        self._label = None
+        self._run = 0
+        self.frames = 0
+        self.skipped = 0
+
+    def check(self, buf, label=None):
+        '''The last result when buf is a near duplicate of the last processed frame, else None.'''
+        self.frames += 1
+        thumb = thumbnail(buf, self.size)
+        self._candidate = thumb
+        if (thumb is None or self._thumb is None or self._result is None
+                or self._run >= self.max_skips or label != self._label):
+            return None
+        if difference(thumb, self._thumb) > self.threshold:
+            return None
+        self._run += 1
+        self.skipped += 1
+        return self._result
+
+    def remember(self, result, label=None):
+        '''Store the result of a frame that was actually processed.'''
+        self._thumb = self._candidate
+        self._result = result
+        self._label = label
+        self._run = 0
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skip_ratio": (self.skipped / self.frames) if self.frames else 0.0,
+        }
@@ -0,0 +1,187 @@
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+from vision import FACE_CLASS, MEDICINE_CLASS, Detection, detections_from_result
+
+log = logging.getLogger("medaware.engines")
+
+# Detector backends. Every detector has detect(frames, conf) -> one list of Detections per frame.
+# 'torch' is ultralytics on PyTorch, 'onnx' is an exported model (see export_model.py) on ONNX Runtime,
+# which with the OpenVINO execution provider also covers OpenVINO. 'stub' needs no model at all,
+# for benchmarks and load tests on machines without the weights or a GPU.
+ENGINES = ("torch", "onnx", "stub")
+
+
+class TorchDetector:
+    def __init__(self, model_path="custom.pt"):
+        import torch # only the torch engine pulls in torch
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.device = "cuda:0" if torch.cuda.is_available() else "cpu"
+
+    def detect(self, frames, conf=0.5):
+        if not frames:
+            return []
+        try:
+            results = self.model.predict(source=frames, conf=conf, verbose=False, device=self.device)
+        except RuntimeError as e:
+            if self.device == "cpu":
+                raise
+            # CUDA out of memory or a broken driver, stay on the CPU from now on
+            log.warning("YOLO on %s failed, falling back to the CPU : %s", self.device, e)
+            self.device = "cpu"
+            results = self.model.predict(source=frames, conf=conf, verbose=False, device=self.device)
+        return [detections_from_result(r) for r in results]
+
+
+class StubDetector:
+    '''
+    Stand-in for the real model: every frame gets one medicine box on the left and one face on
+    the right, at the same place relative to the frame size, so the OCR, tracker and verification
+    paths all run. predict_ms per call plus frame_ms per frame are slept to mimic a model's cost.
+    '''
+
+    device = "stub"
+
+    def __init__(self, model_path=None, predict_ms=0.0, frame_ms=0.0):
+        self.predict_ms = predict_ms
+        self.frame_ms = frame_ms
+
+    def detect(self, frames, conf=0.5):
+        delay = self.predict_ms + self.frame_ms * len(frames)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        results = []
+        for frame in frames:
+            h, w = frame.shape[:2]
+            results.append([
+                Detection(MEDICINE_CLASS, (int(w * 0.15), int(h * 0.3), int(w * 0.45), int(h * 0.85)), 0.9),
+                Detection(FACE_CLASS, (int(w * 0.6), int(h * 0.1), int(w * 0.85), int(h * 0.5)), 0.85),
+            ])
+        return results
+
+
+def letterbox(frame, size, color=(114, 114, 114)):
+    '''Resize keeping the aspect ratio and pad to size x size, the way ultralytics does for export.'''
+    h, w = frame.shape[:2]
+    r = min(size / h, size / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    dw, dh = (size - new_w) / 2, (size - new_h) / 2
+    if (new_w, new_h) != (w, h):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    frame = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return frame, r, (left, top)
+
+
+def decode_output(pred, conf, iou, scale, pad, shape, max_det=300):
+    '''
+    Detections out of one YOLOv8 output row, shape (4 + classes, anchors) with boxes as
+    centre x, centre y, width, height in letterboxed pixels. Class aware NMS like ultralytics.
+    '''
+    pred = pred.T
+    scores = pred[:, 4:]
+    class_ids = scores.argmax(1)
+    confs = scores[np.arange(len(scores)), class_ids]
+    keep = confs > conf
+    if not keep.any():
+        return []
+    boxes, class_ids, confs = pred[keep, :4], class_ids[keep], confs[keep]
+
+    # Shift every class into its own region so NMS never merges boxes of different classes
+    offset = class_ids[:, None] * 7680.0
+    nms_boxes = np.concatenate([boxes[:, :2] - boxes[:, 2:] / 2 + offset, boxes[:, 2:]], axis=1)
+    picked = cv2.dnn.NMSBoxes(nms_boxes.tolist(), confs.tolist(), conf, iou)
+    picked = np.array(picked).reshape(-1)[:max_det]
+
+    h, w = shape
+    detections = []
+    for i in picked:
+        cx, cy, bw, bh = boxes[i]
+        x1 = min(max((cx - bw / 2 - pad[0]) / scale, 0), w)
+        y1 = min(max((cy - bh / 2 - pad[1]) / scale, 0), h)
+        x2 = min(max((cx + bw / 2 - pad[0]) / scale, 0), w)
+        y2 = min(max((cy + bh / 2 - pad[1]) / scale, 0), h)
+        detections.append(Detection(int(class_ids[i]), (int(x1), int(y1), int(x2), int(y2)), float(confs[i])))
+    return detections
+
+
+class OnnxDetector:
+    '''
+    YOLO exported to ONNX, run on ONNX Runtime. threads is the intra-op pool per session,
+    None picks every core, in 'process' mode each worker should get its share instead.
+    Models exported with a dynamic batch dimension get the whole batch in one run.
+    '''
+
+    def __init__(self, model_path="custom.onnx", threads=None, providers=None, iou=0.45, imgsz=640):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = int(threads or 0) # 0 is ORT's own default
+        options.inter_op_num_threads = 1 # the graph is one long chain, parallel branches do not help
+
+        available = ort.get_available_providers()
+        wanted = [p for p in (providers or ["CPUExecutionProvider"]) if p in available]
+        if not wanted:
+            log.warning("None of %s available, using CPUExecutionProvider", providers)
+            wanted = ["CPUExecutionProvider"]
+
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=wanted)
+        self.device = self.session.get_providers()[0]
+        self.iou = iou
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, _ = model_input.shape
+        self.imgsz = height if isinstance(height, int) else imgsz
+        self.batch = batch if isinstance(batch, int) else None # None = dynamic
+
+    def _run(self, frames):
+        blobs, meta = [], []
+        for frame in frames:
+            img, scale, pad = letterbox(frame, self.imgsz)
+            blobs.append(img)
+            meta.append((scale, pad, frame.shape[:2]))
+        if self.batch is not None and len(blobs) < self.batch:
+            blobs += [blobs[-1]] * (self.batch - len(blobs)) # fixed batch size, pad the last chunk
+        # BGR HWC uint8 -> RGB CHW float 0..1
+        batch = np.ascontiguousarray(np.stack(blobs)[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        output = self.session.run(None, {self.input_name: batch})[0]
+        return output, meta
+
+    def detect(self, frames, conf=0.5):
+        results = []
+        step = self.batch or len(frames) or 1
+        for start in range(0, len(frames), step):
+            output, meta = self._run(frames[start:start + step])
+            for pred, (scale, pad, shape) in zip(output, meta):
+                results.append(decode_output(pred, conf, self.iou, scale, pad, shape))
+        return results
+
+
+def warm_up(detector, frames=1, size=(480, 640)):
+    # Dummy frames the size a phone sends, so kernels and buffers are picked for real inputs
+    blank = np.zeros((size[0], size[1], 3), np.uint8)
+    for _ in range(max(1, frames)):
+        detector.detect([blank])
+
+
+def default_threads(workers=1):
+    # Split the cores between the worker processes so their pools do not fight
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def load_detector(engine="torch", model_path="custom.pt", **options):
+    if engine == "onnx":
+        return OnnxDetector(model_path, **options)
+    if engine == "torch":
+        return TorchDetector(model_path)
+    if engine == "stub":
+        return StubDetector(model_path, **options)
+    raise ValueError(f"Unknown inference engine {engine!r}, expected one of {ENGINES}")
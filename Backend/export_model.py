@@ -0,0 +1,165 @@
+'''
+Export custom.pt for the 'onnx' inference engine and check it still finds the same boxes.
+
+    python export_model.py export --model custom.pt                      # -> custom.onnx
+    python export_model.py export --model custom.pt --int8 --calibration frames/
+                                                                         # -> custom.onnx + custom.int8.onnx
+    python export_model.py parity --onnx custom.int8.onnx --frames frames/
+
+Then set INFERENCE_ENGINE = 'onnx' and ONNX_MODEL_PATH in main.py. parity runs every image in
+--frames through both engines and exits non-zero when the ONNX model misses or adds boxes.
+'''
+import argparse
+import glob
+import os
+import sys
+
+import cv2
+import numpy as np
+
+import engines
+from tracker import iou
+
+IMAGE_TYPES = ("*.jpg", "*.jpeg", "*.png")
+
+
+def load_frames(folder, limit=None):
+    paths = sorted(p for pattern in IMAGE_TYPES for p in glob.glob(os.path.join(folder, pattern)))
+    frames = []
+    for path in paths[:limit]:
+        frame = cv2.imread(path)
+        if frame is not None:
+            frames.append((os.path.basename(path), frame))
+    return frames
+
+
+def export_onnx(model_path, imgsz=640):
+    from ultralytics import YOLO
+    # Dynamic batch so the InferenceBatcher can send the whole batch in one run
+    return YOLO(model_path).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+
+
+class _CalibrationReader:
+    '''Feeds sample frames to quantize_static the same way OnnxDetector preprocesses them.'''
+
+    def __init__(self, model_path, frames, imgsz):
+        import onnxruntime as ort
+        self.input_name = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        self.frames = iter(frames)
+        self.imgsz = imgsz
+
+    def get_next(self):
+        item = next(self.frames, None)
+        if item is None:
+            return None
+        img, _, _ = engines.letterbox(item[1], self.imgsz)
+        blob = np.ascontiguousarray(img[None, ..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        return {self.input_name: blob}
+
+
+def quantize_int8(onnx_path, calibration=None, imgsz=640, limit=200):
+    '''
+    INT8 weights and activations (static, QDQ) when calibration frames are given,
+    otherwise INT8 weights only (dynamic). Returns the path of the quantized model.
+    '''
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    out_path = onnx_path.replace(".onnx", ".int8.onnx")
+    prepared = onnx_path.replace(".onnx", ".prep.onnx")
+    quant_pre_process(onnx_path, prepared)
+    try:
+        if calibration:
+            frames = load_frames(calibration, limit)
+            if not frames:
+                raise SystemExit(f"No calibration images in {calibration}")
+            quantize_static(prepared, out_path, _CalibrationReader(prepared, frames, imgsz),
+                            quant_format=QuantFormat.QDQ, per_channel=True,
+                            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+        else:
+            quantize_dynamic(prepared, out_path, weight_type=QuantType.QUInt8)
+    finally:
+        os.remove(prepared)
+    return out_path
+
+
+def compare(reference, candidate, min_iou=0.5):
+    '''Greedy same-class matching, returns (matched pairs, missed reference boxes, extra candidate boxes).'''
+    pairs = sorted(((iou(r.box, c.box), ri, ci) for ri, r in enumerate(reference)
+                    for ci, c in enumerate(candidate) if r.class_id == c.class_id), reverse=True)
+    used_r, used_c, matched = set(), set(), []
+    for overlap, ri, ci in pairs:
+        if overlap < min_iou or ri in used_r or ci in used_c:
+            continue
+        used_r.add(ri)
+        used_c.add(ci)
+        matched.append((reference[ri], candidate[ci], overlap))
+    return matched, len(reference) - len(used_r), len(candidate) - len(used_c)
+
+
+def parity(args):
+    frames = load_frames(args.frames, args.limit)
+    if not frames:
+        raise SystemExit(f"No images in {args.frames}")
+    reference = engines.load_detector("torch", args.model)
+    candidate = engines.load_detector("onnx", args.onnx, threads=args.threads)
+
+    total = matched_total = missed_total = extra_total = 0
+    ious, conf_deltas = [], []
+    for name, frame in frames:
+        ref = reference.detect([frame], conf=args.conf)[0]
+        cand = candidate.detect([frame], conf=args.conf)[0]
+        matched, missed, extra = compare(ref, cand, args.min_iou)
+        total += len(ref)
+        matched_total += len(matched)
+        missed_total += missed
+        extra_total += extra
+        ious += [overlap for _, _, overlap in matched]
+        conf_deltas += [abs(r.conf - c.conf) for r, c, _ in matched]
+        if missed or extra:
+            print(f"{name}: {missed} missed, {extra} extra")
+
+    recall = matched_total / total if total else 1.0
+    precision = matched_total / (matched_total + extra_total) if matched_total + extra_total else 1.0
+    print(f"{len(frames)} frames, {total} reference boxes")
+    print(f"recall {recall:.3f}  precision {precision:.3f}  missed {missed_total}  extra {extra_total}")
+    if ious:
+        print(f"mean IoU {np.mean(ious):.3f}  max conf delta {max(conf_deltas):.3f}")
+    ok = recall >= args.min_recall and precision >= args.min_recall
+    print("PARITY OK" if ok else "PARITY FAILED")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="export custom.pt to ONNX, optionally INT8")
+    exp.add_argument("--model", default="custom.pt")
+    exp.add_argument("--imgsz", type=int, default=640)
+    exp.add_argument("--int8", action="store_true", help="also write an INT8 quantized model")
+    exp.add_argument("--calibration", help="folder of sample frames for static INT8 quantization")
+
+    par = sub.add_parser("parity", help="compare the ONNX model against PyTorch on sample frames")
+    par.add_argument("--model", default="custom.pt")
+    par.add_argument("--onnx", default="custom.onnx")
+    par.add_argument("--frames", required=True, help="folder of sample frames (jpg/png)")
+    par.add_argument("--limit", type=int, default=None)
+    par.add_argument("--conf", type=float, default=0.5)
+    par.add_argument("--min-iou", type=float, default=0.5, help="IoU for two boxes to count as the same")
+    par.add_argument("--min-recall", type=float, default=0.95, help="lower it a bit for INT8 models")
+    par.add_argument("--threads", type=int, default=None)
+
+    args = parser.parse_args()
+    if args.command == "parity":
+        return parity(args)
+
+    onnx_path = export_onnx(args.model, args.imgsz)
+    print(f"ONNX model: {onnx_path}")
+    if args.int8:
+        print(f"INT8 model: {quantize_int8(onnx_path, args.calibration, args.imgsz)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
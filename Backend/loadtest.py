@@ -0,0 +1,355 @@
+'''
+Socket.IO load generator: N simulated camera clients against a running server, each doing what
+CameraView.tsx does. It sends raw_frame, waits for ready_for_frame, follows capture_hint and
+backs off on frame_dropped, then stops scanning on verified.
+
+Start a server on the stub models first, so capacity is measured without the real weights or a GPU:
+
+    MEDAWARE_ENGINE=stub MEDAWARE_OCR_ENGINE=stub python main.py
+
+then
+
+    python loadtest.py --clients 100 --duration 60
+    python loadtest.py --steps 25,50,100,200,400 --duration 30 --max-p95-ms 1000
+    python loadtest.py --clients 200 --pace ready --overlay metadata --protocol binary
+
+Every client is one user (loadtest-<index>@loadtest.invalid) with its own reminders carrying
+--medicine, so each scan verifies its own (uid, rid) and goes through the log writer. A reminder
+is spent for the day once verified, a client scans the ones its user already has that are not
+(looked up with /get_schedule and /get_adherence, also those of earlier steps and runs) and only
+adds a reminder through the REST endpoints when none is left. After a verification a client
+reconnects and scans again, like the next patient, until --duration is over. Within a day every
+scan past the reminders a user already has adds one, the next day they are all unspent again, so
+a user ends up with as many reminders as its busiest day scanned. reminder_log (and its rollup)
+still gain one Verified row per scan, that is the path being measured. The REST calls are not
+part of the numbers.
+
+--uid/--rid make every client scan the same existing reminder instead. Only the first scan of
+the day logs it, every later one is answered from the verification lock with log "already" at
+its first frame, so time to verified and the log writer are then measured for one scan only.
+'''
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import socketio
+
+from bench_vision import describe, load_directory, synthetic_frames
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = [] # raw_frame sent -> annotated_frame / frame_detections, ms
+        self.verifications = [] # scan start -> verified, seconds
+        self.connects = [] # ms
+        self.sent = 0
+        self.answered = 0
+        self.already = 0 # verified from the verification lock, nothing logged
+        self.seed_failures = 0
+        self.shed = 0 # frame_dropped from the scheduler
+        self.unanswered = 0 # ready_for_frame (or the timeout) came without an answer
+        self.timeouts = 0
+        self.errors = 0
+        self.connect_failures = 0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def record(self, name, value):
+        with self.lock:
+            getattr(self, name).append(value)
+
+
+class Fixture:
+    '''One simulated user and its reminders not verified today, kept from step to step.'''
+
+    def __init__(self, index):
+        self.index = index
+        self.uid = None
+        self.unspent = None # rids, None until read from the server
+
+
+class SimulatedCamera:
+    def __init__(self, index, args, frames, stats, deadline, fixture):
+        self.index = index
+        self.fixture = fixture
+        self.args = args
+        self.frames = frames
+        self.stats = stats
+        self.deadline = deadline
+        self.position = random.Random(index).randrange(len(frames)) # clients do not move in lock step
+        self.interval_ms = 1000 # until the server sends a capture_hint
+        self.backoff_until = 0.0
+        self.ready = threading.Event()
+        self.sent_at = None
+        self.verified = threading.Event()
+        self.already = False # the last verified came from the lock
+        self.uid = args.uid
+        self.rid = args.rid
+
+    def _post(self, path, body):
+        request = urllib.request.Request(self.args.url + path, json.dumps(body).encode(),
+                                         {"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return json.loads(e.read() or b"{}")
+
+    def _get(self, path):
+        with urllib.request.urlopen(self.args.url + path, timeout=10) as response:
+            return json.loads(response.read())
+
+    def _unspent(self, uid):
+        '''The user's reminders with the medicine on them that nothing verified today.'''
+        rids = [reminder["rid"] for reminder in self._get(f"/get_schedule?uid={uid}")
+                if any(medicine["mname"] == self.args.medicine for medicine in reminder["medicines"])]
+        spent = {reminder["rid"] for reminder in self._get(f"/get_adherence?uid={uid}&days=1")["reminders"]
+                 if reminder["verified"]}
+        return [rid for rid in rids if rid not in spent]
+
+    def _seed(self):
+        '''The user (once) and a reminder for this scan, False when the server refused.'''
+        if self.args.uid is not None:
+            return True
+        fixture = self.fixture
+        if fixture.uid is None:
+            account = {"email": f"{self.args.email_prefix}-{self.index}@loadtest.invalid", "password": "loadtest"}
+            self._post("/register", account) # fails harmlessly when a previous run created it
+            fixture.uid = self._post("/login", account).get("uid")
+            if fixture.uid is None:
+                return False
+        if fixture.unspent is None:
+            fixture.unspent = self._unspent(fixture.uid)
+        self.uid = fixture.uid
+        if fixture.unspent:
+            self.rid = fixture.unspent[0]
+            return True
+        rid = self._post("/add_reminder", {"uid": self.uid}).get("rid")
+        if rid is None:
+            return False
+        added = self._post("/add_medicine", {"uid": self.uid, "rid": rid, "mname": self.args.medicine,
+                                             "dose_qty": 1, "total_qty": 30})
+        if "mid" not in added:
+            return False
+        fixture.unspent.append(rid)
+        self.rid = rid
+        return True
+
+    def _payload(self):
+        frame = self.frames[self.position % len(self.frames)]
+        self.position += 1
+        if self.args.protocol == "base64":
+            frame = base64.b64encode(frame).decode("ascii")
+        return {"uid": self.uid, "rid": self.rid, "frame": frame}
+
+    def _answered(self, data):
+        if self.sent_at is not None:
+            self.stats.record("latencies", (time.monotonic() - self.sent_at) * 1000)
+            self.stats.add(answered=1)
+            self.sent_at = None
+
+    def _client(self):
+        sio = socketio.Client(reconnection=False)
+        sio.on("annotated_frame", self._answered)
+        sio.on("frame_detections", self._answered)
+        sio.on("ready_for_frame", lambda data=None: self.ready.set())
+
+        def capture_hint(hint):
+            if hint and hint.get("interval_ms"):
+                self.interval_ms = hint["interval_ms"]
+
+        def frame_dropped(data):
+            self.stats.add(shed=1)
+            self.sent_at = None
+            self.backoff_until = time.monotonic() + (data or {}).get("retry_after_ms", 1000) / 1000.0
+
+        def app_error(data):
+            self.stats.add(errors=1)
+
+        sio.on("capture_hint", capture_hint)
+        sio.on("frame_dropped", frame_dropped)
+        def verified(data=None):
+            self.already = (data or {}).get("log") == "already"
+            if self.already:
+                self.stats.add(already=1)
+            self.verified.set()
+
+        sio.on("verified", verified)
+        sio.on("app_error", app_error)
+        return sio
+
+    def _scan(self):
+        try:
+            seeded = self._seed()
+        except Exception:
+            seeded = False
+        if not seeded:
+            self.stats.add(seed_failures=1)
+            time.sleep(1)
+            return
+        sio = self._client()
+        start = time.monotonic()
+        try:
+            sio.connect(self.args.url, auth={"frame_protocol": self.args.protocol, "overlay": self.args.overlay},
+                        transports=[self.args.transport], wait_timeout=10)
+        except Exception:
+            self.stats.add(connect_failures=1)
+            time.sleep(1)
+            return
+        self.stats.record("connects", (time.monotonic() - start) * 1000)
+        self.verified.clear()
+        scan_started = time.monotonic()
+        try:
+            while time.monotonic() < self.deadline and not self.verified.is_set():
+                wait = self.backoff_until - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                self.ready.clear()
+                sent = self.sent_at = time.monotonic()
+                sio.emit("raw_frame", self._payload())
+                self.stats.add(sent=1)
+                if not self.ready.wait(self.args.frame_timeout):
+                    self.stats.add(timeouts=1)
+                # ready_for_frame follows the answer, a frame it came without was dropped
+                if self.sent_at is not None:
+                    self.stats.add(unanswered=1)
+                    self.sent_at = None
+                if self.args.pace == "hint":
+                    # CameraView re-arms its timer for interval_ms after each capture
+                    time.sleep(max(0.0, sent + self.interval_ms / 1000.0 - time.monotonic()))
+            if self.verified.is_set():
+                if not self.already:
+                    self.stats.record("verifications", time.monotonic() - scan_started)
+                if self.args.uid is None:
+                    self.fixture.unspent.remove(self.rid) # logged today, the next scan takes another one
+        finally:
+            sio.disconnect()
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            self._scan()
+            if not self.args.rescan:
+                break
+
+
+def run_step(clients, args, frames, fixtures):
+    stats = Stats()
+    started = time.monotonic()
+    deadline = started + args.ramp + args.duration
+    threads = []
+    for index in range(clients):
+        fixture = fixtures.setdefault(index, Fixture(index))
+        camera = SimulatedCamera(index, args, frames, stats, deadline, fixture)
+        thread = threading.Thread(target=camera.run, daemon=True)
+        thread.start()
+        threads.append(thread)
+        if args.ramp:
+            time.sleep(args.ramp / float(clients))
+    for thread in threads:
+        thread.join(args.duration + args.ramp + args.frame_timeout + 15)
+    elapsed = time.monotonic() - started
+
+    latency = describe(stats.latencies)
+    verification = describe(stats.verifications)
+    drop_rate = (stats.sent - stats.answered) / stats.sent if stats.sent else 0.0
+    return {
+        "clients": clients,
+        "seconds": round(elapsed, 1),
+        "sent": stats.sent,
+        "answered": stats.answered,
+        "answered_per_s": stats.answered / elapsed if elapsed else 0.0,
+        "shed": stats.shed,
+        "unanswered": stats.unanswered,
+        "timeouts": stats.timeouts,
+        "errors": stats.errors,
+        "already": stats.already,
+        "seed_failures": stats.seed_failures,
+        "drop_rate": drop_rate,
+        "connect_failures": stats.connect_failures,
+        "connect_ms": describe(stats.connects),
+        "latency_ms": latency,
+        "verified": verification["count"],
+        "verification_s": verification,
+    }
+
+
+def print_step(step):
+    latency, verification = step["latency_ms"], step["verification_s"]
+    print(f"\n{step['clients']} clients, {step['seconds']}s: {step['sent']} frames sent, {step['answered']} answered "
+          f"({step['answered_per_s']:.1f}/s), drop rate {step['drop_rate']:.1%} "
+          f"(shed {step['shed']}, unanswered {step['unanswered']}, timeouts {step['timeouts']}), "
+          f"errors {step['errors']}, connect failures {step['connect_failures']}, seed failures {step['seed_failures']}")
+    if step["already"]:
+        print(f"  {step['already']} scans were answered 'already' by the verification lock, not timed through the log path")
+    if latency["count"]:
+        print(f"  frame latency ms  p50 {latency['p50']:.0f}  p95 {latency['p95']:.0f}  "
+              f"p99 {latency['p99']:.0f}  max {latency['max']:.0f}")
+    if verification["count"]:
+        print(f"  time to verified s  {verification['count']} scans  p50 {verification['p50']:.1f}  "
+              f"p95 {verification['p95']:.1f}  max {verification['max']:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--clients", type=int, default=50, help="concurrent camera clients")
+    load.add_argument("--steps", help="comma separated client counts run one after the other, e.g. 25,50,100")
+    parser.add_argument("--duration", type=float, default=30, help="seconds each step sends frames, after the ramp")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds over which the clients connect")
+    parser.add_argument("--uid", type=int, default=None, help="with --rid, one existing reminder for every client, see above")
+    parser.add_argument("--rid", type=int, default=None)
+    parser.add_argument("--email-prefix", default="loadtest", help="of the users the clients register")
+    parser.add_argument("--medicine", default="Paracetamol", help="added to each reminder, what the frames show")
+    parser.add_argument("--protocol", choices=("base64", "binary"), default="base64", help="CameraView sends base64")
+    parser.add_argument("--overlay", choices=("image", "metadata"), default="image")
+    parser.add_argument("--transport", choices=("websocket", "polling"), default="websocket")
+    parser.add_argument("--pace", choices=("hint", "ready"), default="hint",
+                        help="hint waits capture_hint's interval like the app, ready sends as soon as allowed")
+    parser.add_argument("--frame-timeout", type=float, default=10, help="seconds to wait for ready_for_frame")
+    parser.add_argument("--no-rescan", dest="rescan", action="store_false", help="stop a client after its first verification")
+    parser.add_argument("--frames", help="folder of recorded frames, default synthetic ones")
+    parser.add_argument("--size", type=int, default=400, help="width of synthetic frames, CameraView's default max_dimension")
+    parser.add_argument("--quality", type=int, default=30)
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="with --steps, the latency a step must stay under")
+    parser.add_argument("--max-drop-rate", type=float, default=0.05, help="with --steps, the drop rate a step must stay under")
+    args = parser.parse_args()
+    if (args.uid is None) != (args.rid is None):
+        parser.error("--uid and --rid go together")
+
+    frames = load_directory(args.frames) if args.frames else synthetic_frames(60, args.size, args.quality, seed=7)
+    if not frames:
+        raise SystemExit(f"No frames in {args.frames}")
+    steps = [int(n) for n in args.steps.split(",")] if args.steps else [args.clients]
+
+    capacity = None
+    fixtures = {} # index -> Fixture, the same users and reminders in every step
+    for clients in steps:
+        step = run_step(clients, args, frames, fixtures)
+        print_step(step)
+        p95 = step["latency_ms"].get("p95")
+        within = step["drop_rate"] <= args.max_drop_rate and (
+            args.max_p95_ms is None or (p95 is not None and p95 <= args.max_p95_ms))
+        if not within:
+            print("  over the limit")
+            if args.steps:
+                break
+        else:
+            capacity = clients
+    if args.steps:
+        print(f"\nCapacity: {capacity if capacity is not None else 'below ' + str(steps[0])} clients "
+              f"(drop rate <= {args.max_drop_rate:.0%}"
+              + (f", p95 <= {args.max_p95_ms:.0f}ms" if args.max_p95_ms is not None else "") + ")")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+'''
+A stand-in for Redis on one machine, so the multi-node paths (the verification lock contended
+across nodes, presence, emits routed to a sid on another node) can be run without one:
+
+    python localhub.py --port 6390
+
+then start every node with
+
+    MEDAWARE_STATE_BACKEND=local://127.0.0.1:6390 MEDAWARE_MESSAGE_QUEUE=local://127.0.0.1:6390
+
+The hub holds one cluster.MemoryBackend for all of them and fans Socket.IO queue messages out to
+every node, twonode.py starts a hub and two nodes and checks those paths end to end.
+
+Not for production: nothing is persisted, there is no authentication (it binds to 127.0.0.1
+unless told otherwise) and one slow node holds up the fan-out to the others. Messages are
+length prefixed JSON, sets travel as lists.
+'''
+import argparse
+import json
+import logging
+import socket
+import struct
+import threading
+import time
+
+import socketio
+
+import telemetry
+from cluster import MemoryBackend
+
+log = logging.getLogger("medaware.localhub")
+
+# What a node may call on the hub's MemoryBackend
+_OPERATIONS = ("get", "set", "add", "delete", "delete_if", "sadd", "srem", "smembers")
+
+
+def _address(url):
+    # local://host:port
+    host, _, port = url.split("://", 1)[1].rstrip("/").rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def _send(sock, message):
+    data = json.dumps(message).encode()
+    sock.sendall(struct.pack("!I", len(data)) + data)
+
+
+def _exactly(sock, size):
+    buf = b""
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise EOFError("hub connection closed")
+        buf += chunk
+    return buf
+
+
+def _recv(sock):
+    size, = struct.unpack("!I", _exactly(sock, 4))
+    return json.loads(_exactly(sock, size))
+
+
+class Hub:
+    '''The hub process: one thread per node connection, see the module docstring.'''
+
+    def __init__(self, host="127.0.0.1", port=6390):
+        self.host = host
+        self.port = port
+        self.backend = MemoryBackend()
+        self._subscribers = {} # channel -> [socket, ...]
+        self._lock = threading.Lock()
+
+    def serve_forever(self):
+        self.backend.start_sweeper(lambda target: threading.Thread(target=target, daemon=True).start(), time.sleep)
+        listener = socket.create_server((self.host, self.port))
+        log.info("Hub listening on %s:%s", self.host, self.port)
+        while True:
+            sock, _ = listener.accept()
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _serve(self, sock):
+        try:
+            while True:
+                message = _recv(sock)
+                if message[0] == "subscribe":
+                    # From now on this connection only receives, the publishers write to it
+                    with self._lock:
+                        self._subscribers.setdefault(message[1], []).append(sock)
+                    return
+                if message[0] == "publish":
+                    self._publish(message[1], message[2])
+                    continue
+                _, operation, args = message
+                if operation not in _OPERATIONS:
+                    _send(sock, ["error", f"unknown operation {operation!r}"])
+                    continue
+                value = getattr(self.backend, operation)(*args)
+                _send(sock, ["ok", sorted(value) if isinstance(value, set) else value])
+        except (EOFError, OSError):
+            sock.close()
+
+    def _publish(self, channel, data):
+        with self._lock:
+            for sock in list(self._subscribers.get(channel, [])):
+                try:
+                    _send(sock, data)
+                except OSError:
+                    self._subscribers[channel].remove(sock) # that node went away
+                    sock.close()
+
+
+class _Connection:
+    '''One request / reply connection to the hub, reopened after an error.'''
+
+    def __init__(self, address):
+        self.address = address
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def request(self, message, reply=True):
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._sock = socket.create_connection(self.address, timeout=5)
+                    self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                _send(self._sock, message)
+                return _recv(self._sock) if reply else None
+            except (EOFError, OSError):
+                if self._sock is not None:
+                    self._sock.close()
+                self._sock = None
+                raise
+
+
+class LocalBackend:
+    '''The hub's MemoryBackend, the same operations as cluster.RedisBackend.'''
+
+    def __init__(self, url):
+        self._hub = _Connection(_address(url))
+
+    def _call(self, operation, *args):
+        status, value = self._hub.request(["call", operation, list(args)])
+        if status != "ok":
+            raise RuntimeError(value)
+        return value
+
+    def get(self, key):
+        return self._call("get", key)
+
+    def set(self, key, value, ttl=None):
+        self._call("set", key, value, ttl)
+
+    def add(self, key, value, ttl=None):
+        return self._call("add", key, value, ttl)
+
+    def delete(self, key):
+        self._call("delete", key)
+
+    def delete_if(self, key, value):
+        return self._call("delete_if", key, value)
+
+    def sadd(self, key, member, ttl=None):
+        self._call("sadd", key, member, ttl)
+
+    def srem(self, key, member):
+        self._call("srem", key, member)
+
+    def smembers(self, key):
+        return set(self._call("smembers", key))
+
+
+class LocalQueueManager(socketio.PubSubManager):
+    '''Socket.IO message queue through the hub, in place of socketio.RedisManager.'''
+    name = "localhub"
+
+    def __init__(self, url, channel="flask-socketio", write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.address = _address(url)
+        self._hub = _Connection(self.address)
+
+    def _publish(self, data):
+        self._hub.request(["publish", self.channel, self.json.dumps(data)], reply=False)
+
+    def _listen(self):
+        while True:
+            try:
+                sock = socket.create_connection(self.address)
+            except OSError:
+                time.sleep(1) # hub not up yet, or restarting
+                continue
+            try:
+                _send(sock, ["subscribe", self.channel])
+                while True:
+                    yield _recv(sock) # the JSON text _publish sent, PubSubManager decodes it
+            except (EOFError, OSError):
+                sock.close()
+                time.sleep(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared state and Socket.IO queue for nodes on one machine")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    telemetry.setup_logging("INFO")
+    Hub(args.host, args.port).serve_forever()
@@ -0,0 +1,173 @@
+import logging
+import threading
+import time
+
+log = logging.getLogger("medaware.logwriter")
+
+
+class LogQueueFull(Exception):
+    pass
+
+
+class _PendingRow:
+    __slots__ = ("row", "queued", "done", "error")
+
+    def __init__(self, row):
+        self.row = row
+        self.queued = time.monotonic()
+        self.done = threading.Event()
+        self.error = None
+
+    def wait(self, timeout=None):
+        '''True once the row is committed, False if writing it failed or timeout passed first.'''
+        return self.done.wait(timeout) and self.error is None
+
+
+class LogWriter:
+    '''
+    Write-behind queue for Reminder_Log rows. Handlers submit() a row and carry on, a flush loop
+    writes whatever has piled up with one bulk insert and one commit, as soon as flush_rows are
+    waiting or the oldest has waited flush_ms. Around dose times that turns thousands of
+    single row transactions into a handful.
+
+    write_fn(rows) inserts and commits a list of row dicts. When a batch fails the rows are
+    written one by one, so one bad row (say a rid that was just deleted) does not take the
+    others with it.
+
+    The queue holds at most max_queue rows, submit() then waits up to put_timeout for the
+    flush loop to make room and raises LogQueueFull after that, rather than growing without
+    bound while the database is down. Callers that need the row on disk wait() on what
+    submit() returns. close() writes everything still queued, main.py calls it on shutdown.
+    '''
+
+    def __init__(self, write_fn, flush_rows=500, flush_ms=200, max_queue=10000, put_timeout=2.0, spawn=None):
+        self.write_fn = write_fn
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = flush_ms / 1000.0
+        self.max_queue = max(self.flush_rows, int(max_queue))
+        self.put_timeout = put_timeout
+        self._spawn = spawn
+        self._pending = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock() # the flush loop and close() never write at the same time
+        self._worker = None
+        self._closed = False
+        self._inflight = [] # taken off the queue by the flush loop, not written yet
+
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+        self.batches = 0
+        self.flush_ms_total = 0.0
+
+    def _launch(self, target, *args):
+        if self._spawn is None:
+            thread = threading.Thread(target=target, args=args, daemon=True)
+            thread.start()
+            return thread
+        return self._spawn(target, *args)
+
+    def start(self):
+        '''Start the flush loop, submit() calls this on first use.'''
+        if self._worker is None:
+            self._worker = self._launch(self._run)
+
+    def submit(self, row):
+        self.start()
+        pending = _PendingRow(row)
+        with self._cond:
+            if self._closed:
+                raise LogQueueFull("log writer is closed")
+            deadline = time.monotonic() + self.put_timeout
+            while len(self._pending) >= self.max_queue:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    raise LogQueueFull(f"{len(self._pending)} log rows waiting to be written")
+                self._cond.notify_all()
+                self._cond.wait(remaining)
+            self._pending.append(pending)
+            self.submitted += 1
+            if len(self._pending) == 1 or len(self._pending) >= self.flush_rows:
+                self._cond.notify_all()
+        return pending
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            flush_at = self._pending[0].queued + self.flush_interval
+            while len(self._pending) < self.flush_rows:
+                remaining = flush_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.flush_rows]
+            del self._pending[:self.flush_rows]
+            self._inflight = batch
+            self._cond.notify_all() # submitters waiting for room
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            with self._write_lock:
+                self._write(batch)
+            self._inflight = []
+
+    def _write(self, batch):
+        start = time.monotonic()
+        try:
+            self.write_fn([p.row for p in batch])
+            self.written += len(batch)
+        except Exception as e:
+            log.error("Writing %s log rows failed, retrying them one by one : %s", len(batch), e)
+            for p in batch:
+                try:
+                    self.write_fn([p.row])
+                    self.written += 1
+                except Exception as row_error:
+                    log.error("Log row %s dropped : %s", p.row, row_error)
+                    p.error = row_error
+                    self.failed += 1
+        finally:
+            self.batches += 1
+            self.flush_ms_total += (time.monotonic() - start) * 1000
+            for p in batch:
+                p.done.set()
+
+    def flush(self):
+        '''Write everything queued right now, in the calling thread.'''
+        with self._write_lock:
+            while True:
+                with self._cond:
+                    batch = self._pending[:self.flush_rows]
+                    del self._pending[:self.flush_rows]
+                    self._cond.notify_all()
+                if not batch:
+                    return
+                self._write(batch)
+
+    def close(self, timeout=10.0):
+        '''Stop taking rows and write the ones still queued.'''
+        with self._cond:
+            self._closed = True
+        queued = len(self._pending) + len(self._inflight)
+        self.flush()
+        for p in list(self._inflight):
+            p.done.wait(timeout)
+        if queued:
+            log.info("Log writer closed, flushed %s queued rows", queued)
+
+    def stats(self):
+        return {
+            "queued": len(self._pending),
+            "submitted": self.submitted,
+            "written": self.written,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "avg_batch_size": (self.written + self.failed) / self.batches if self.batches else 0.0,
+            "avg_flush_ms": self.flush_ms_total / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,144 @@
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# name is the medicine name as the user typed it, score is 1.0 for an exact match and
+# drops with the edit distance relative to the word length
+Match = namedtuple("Match", "name score")
+
+_TOKEN = re.compile(r"[A-Z0-9]+")
+
+
+def normalize(text):
+    return "".join(_TOKEN.findall(text.upper()))
+
+
+def levenshtein(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    '''Burkhard-Keller tree, finds every word within an edit distance without scanning them all.'''
+
+    def __init__(self):
+        self.root = None # (word, {distance: child})
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            distance = levenshtein(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    def search(self, word, max_distance):
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = levenshtein(word, node[0])
+            if distance <= max_distance:
+                found.append((distance, node[0]))
+            # Triangle inequality: only children in [d - max, d + max] can be close enough
+            for edge, child in node[1].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+
+class MedicineIndex:
+    '''
+    Fuzzy index over one user's prescribed medicine names (Medicine_Reminder.mname).
+    OCR strings are matched whole and token by token, so "PARACETAM0L 500MG" still finds
+    "Paracetamol". max_ratio bounds the edit distance searched as a share of the query length.
+    '''
+
+    def __init__(self, names, max_ratio=0.34):
+        self.max_ratio = max_ratio
+        self.names = {}
+        self.tree = BKTree()
+        for name in names:
+            key = normalize(name or "")
+            if len(key) >= 3 and key not in self.names:
+                self.names[key] = name.strip()
+                self.tree.add(key)
+
+    def __len__(self):
+        return len(self.names)
+
+    def match(self, text):
+        '''Best Match for an OCR string, None when nothing prescribed is close enough.'''
+        upper = text.upper()
+        queries = {normalize(upper)} | {token for token in _TOKEN.findall(upper) if len(token) >= 3}
+        best = None
+        for query in queries:
+            if not query:
+                continue
+            for distance, key in self.tree.search(query, int(len(query) * self.max_ratio)):
+                score = 1.0 - distance / float(max(len(query), len(key)))
+                if best is None or score > best.score:
+                    best = Match(self.names[key], score)
+        return best
+
+
+class IndexCache:
+    '''
+    Bounded LRU with a TTL of MedicineIndex by uid, so users who scanned once are not kept
+    forever. load(uid) -> names reads the prescribed names. An entry is rebuilt when its
+    version (from version_fn, bumped by add_medicine on any node) changed or it is older
+    than ttl, the ttl covers a backend that was unreachable when the version was bumped.
+    '''
+
+    def __init__(self, load, version_fn, max_entries=1024, ttl=600.0, clock=time.monotonic):
+        self.load = load
+        self.version_fn = version_fn
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict() # uid -> (version, expires, MedicineIndex), least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, uid):
+        version = self.version_fn(uid)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is not None and entry[0] == version and entry[1] > now:
+                self._entries.move_to_end(uid)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+        index = MedicineIndex(self.load(uid)) # outside the lock, like UserCache
+        with self._lock:
+            self._entries[uid] = (version, now + self.ttl, index)
+            self._entries.move_to_end(uid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return index
+
+    def invalidate(self, uid):
+        with self._lock:
+            self._entries.pop(uid, None)
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
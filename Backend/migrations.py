@@ -0,0 +1,151 @@
+'''
+Versioned schema changes for databases created before the models declared them.
+db.create_all() only creates missing tables, it never touches existing ones, so every change
+to an existing table goes here as a numbered step. Steps check what is already there, so a
+fresh database (where create_all built everything from models.py) just gets its version stamped.
+
+    python migrations.py status
+    python migrations.py upgrade
+
+main.py runs upgrade() at startup when DB_AUTO_MIGRATE is on.
+'''
+import logging
+import sys
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+log = logging.getLogger("medaware.migrations")
+
+
+class MigrationError(Exception):
+    pass
+
+
+def _indexes(conn, table):
+    return {ix["name"] for ix in inspect(conn).get_indexes(table)}
+
+
+def _foreign_keys(conn, table):
+    return {fk["name"] for fk in inspect(conn).get_foreign_keys(table) if fk.get("name")}
+
+
+def _create_index(conn, name, table, columns, unique=False):
+    if name not in _indexes(conn, table):
+        conn.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({', '.join(columns)})"))
+
+
+def _add_foreign_key(conn, name, table, column, ref_table, ref_column):
+    if conn.dialect.name == "sqlite":
+        return # sqlite cannot add a constraint to an existing table, the index still helps
+    orphans = conn.execute(text(
+        f"SELECT COUNT(*) FROM {table} t LEFT JOIN {ref_table} r ON t.{column} = r.{ref_column} "
+        f"WHERE t.{column} IS NOT NULL AND r.{ref_column} IS NULL")).scalar()
+    if orphans:
+        raise MigrationError(f"{orphans} rows in {table}.{column} point at no {ref_table} row, "
+                             f"fix or delete them before adding {name}")
+    if name not in _foreign_keys(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({column}) "
+                          f"REFERENCES {ref_table} ({ref_column})"))
+
+
+def unique_email(conn):
+    duplicates = conn.execute(text(
+        "SELECT email, COUNT(*) FROM users WHERE email IS NOT NULL GROUP BY email HAVING COUNT(*) > 1")).fetchall()
+    if duplicates:
+        emails = ", ".join(email for email, _ in duplicates[:10])
+        raise MigrationError(f"{len(duplicates)} emails are used by more than one user ({emails}), merge them first")
+    if conn.dialect.name == "mysql":
+        # MySQL can only index a TEXT column by prefix, a bounded VARCHAR is indexed whole
+        conn.execute(text("ALTER TABLE users MODIFY email VARCHAR(255)"))
+    elif conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE users ALTER COLUMN email TYPE VARCHAR(255)"))
+    _create_index(conn, "ix_users_email", "users", ["email"], unique=True)
+
+
+def owner_keys(conn):
+    _create_index(conn, "ix_reminders_uid", "reminders", ["uid"])
+    _create_index(conn, "ix_medicine_reminder_rid", "medicine_reminder", ["rid"])
+    _create_index(conn, "ix_reminder_log_rid", "reminder_log", ["rid"])
+    _add_foreign_key(conn, "fk_reminders_uid_users", "reminders", "uid", "users", "uid")
+    _add_foreign_key(conn, "fk_medicine_reminder_rid_reminders", "medicine_reminder", "rid", "reminders", "rid")
+    _add_foreign_key(conn, "fk_reminder_log_rid_reminders", "reminder_log", "rid", "reminders", "rid")
+
+
+def reminder_log_lookup(conn):
+    # Leading uid also serves every "logs of this user" query, so no separate uid index
+    _create_index(conn, "ix_reminder_log_uid_date_status", "reminder_log", ["uid", "date", "status"])
+    _add_foreign_key(conn, "fk_reminder_log_uid_users", "reminder_log", "uid", "users", "uid")
+
+
+def adherence_rollup(conn):
+    import analytics
+    from models import Adherence_Daily
+    Adherence_Daily.__table__.create(conn, checkfirst=True)
+    # Backfill from the logs written before the rollup existed
+    if not conn.execute(text("SELECT COUNT(*) FROM adherence_daily")).scalar():
+        analytics.rebuild(conn)
+
+
+def reminder_time(conn):
+    # The reminder scheduler reads reminders one slice of rtime at a time
+    _create_index(conn, "ix_reminders_rtime", "reminders", ["rtime"])
+
+
+# (version, description, step), applied in order, never renumber or edit a released step
+MIGRATIONS = [
+    (1, "unique index on users.email", unique_email),
+    (2, "indexes and foreign keys on reminders.uid, medicine_reminder.rid, reminder_log.rid", owner_keys),
+    (3, "composite (uid, date, status) index on reminder_log", reminder_log_lookup),
+    (4, "adherence_daily rollup table, backfilled from reminder_log", adherence_rollup),
+    (5, "index on reminders.rtime", reminder_time),
+]
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, description VARCHAR(255), applied_at DATETIME)"))
+
+
+def current_version(engine):
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def upgrade(engine, target=None):
+    '''Apply every step above the database's version (up to target), returns the versions applied.'''
+    applied = []
+    version = current_version(engine)
+    for number, description, step in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+        # One transaction per step, MySQL commits DDL implicitly but the version row still
+        # only lands once the step went through
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(text("INSERT INTO schema_version (version, description, applied_at) "
+                              "VALUES (:version, :description, :applied_at)"),
+                         {"version": number, "description": description, "applied_at": datetime.utcnow()})
+        log.info("Migration %s applied: %s", number, description)
+        applied.append(number)
+    return applied
+
+
+def main():
+    from main import app, db
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    with app.app_context():
+        if command == "upgrade":
+            upgrade(db.engine)
+        version = current_version(db.engine)
+        latest = MIGRATIONS[-1][0]
+        print(f"Schema version {version} of {latest}")
+        for number, description, _ in MIGRATIONS:
+            print(f"  [{'x' if number <= version else ' '}] {number} {description}")
+
+
+if __name__ == "__main__":
+    main()
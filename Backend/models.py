@@ -10,7 +10,7 @@ class User(db.Model, SerializerMixin):
     gender = db.Column(db.String(5))
     height = db.Column(db.Integer)
     weight = db.Column(db.Integer)
-    email = db.Column(db.Text)
+    email = db.Column(db.String(255), unique=True, index=True) # login looks users up by it
     password = db.Column(db.Text)
     def to_dict(self):
         return { 
@@ -26,8 +26,8 @@ class User(db.Model, SerializerMixin):
 class Reminder(db.Model, SerializerMixin):
     __tablename__ = "reminders"
     rid = db.Column(db.Integer, primary_key=True)
-    uid = db.Column(db.Integer)
-    rtime = db.Column(db.Time)
+    uid = db.Column(db.Integer, db.ForeignKey("users.uid", name="fk_reminders_uid_users"), index=True)
+    rtime = db.Column(db.Time, index=True) # the reminder scheduler reads it by time range
     def to_dict(self):
         return {
             "rid": self.rid,
@@ -39,7 +39,7 @@ class Medicine_Reminder(db.Model, SerializerMixin):
     __tablename__ = "medicine_reminder"
     mid = db.Column(db.Integer, primary_key=True)
     mname = db.Column(db.Text)
-    rid = db.Column(db.Integer)
+    rid = db.Column(db.Integer, db.ForeignKey("reminders.rid", name="fk_medicine_reminder_rid_reminders"), index=True)
     dose_qty = db.Column(db.Integer)
     total_qty = db.Column(db.Integer)
     def to_dict(self):
@@ -53,10 +53,12 @@ class Medicine_Reminder(db.Model, SerializerMixin):
 
 class Reminder_Log(db.Model, SerializerMixin):
     __tablename__ = "reminder_log"
+    # Adherence queries filter on a user's logs by day and status, uid leads so it covers plain uid lookups too
+    __table_args__ = (db.Index("ix_reminder_log_uid_date_status", "uid", "date", "status"),)
     logid = db.Column(db.Integer, primary_key=True)
     status = db.Column(db.String(15))
-    rid = db.Column(db.Integer)
-    uid = db.Column(db.Integer)
+    rid = db.Column(db.Integer, db.ForeignKey("reminders.rid", name="fk_reminder_log_rid_reminders"), index=True)
+    uid = db.Column(db.Integer, db.ForeignKey("users.uid", name="fk_reminder_log_uid_users"))
     date = db.Column(db.Date)  # ✅ Corrected
     def to_dict(self):
         return {
@@ -65,4 +67,23 @@ class Reminder_Log(db.Model, SerializerMixin):
             "rid": self.rid,
             "uid": self.uid,
             "date": self.date
-        }
\ No newline at end of file
+        }
+
+class Adherence_Daily(db.Model, SerializerMixin):
+    # Per user, day and reminder counts of reminder_log, kept up to date by analytics.py
+    __tablename__ = "adherence_daily"
+    uid = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    day = db.Column(db.Date, primary_key=True)
+    rid = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    verified = db.Column(db.Integer, nullable=False, default=0)
+    missed = db.Column(db.Integer, nullable=False, default=0)
+    not_verified = db.Column(db.Integer, nullable=False, default=0)
+    def to_dict(self):
+        return {
+            "uid": self.uid,
+            "day": self.day,
+            "rid": self.rid,
+            "verified": self.verified,
+            "missed": self.missed,
+            "not_verified": self.not_verified
+        }
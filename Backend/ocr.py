@@ -0,0 +1,304 @@
+import logging
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+
+import cv2
+import numpy as np
+
+log = logging.getLogger("medaware.ocr")
+
+# 'detect' runs EasyOCR's own text detector on every crop (handles multi-line labels),
+# 'recognize' trusts the YOLO box and only runs the recogniser, much cheaper
+OCR_MODES = ("detect", "recognize")
+
+_clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(4, 4))
+
+# texts are the confident OCR strings for one medicine crop, fingerprint is the crop's dHash,
+# cached is True when the texts came from the session's cache instead of EasyOCR.
+# A cache miss comes out of the frame runner with texts=None and the crop still attached.
+OcrRead = namedtuple("OcrRead", "texts fingerprint cached crop", defaults=(None,))
+# What a FrameJob carries to the runner: the still-valid cache entries as (fingerprint, texts)
+OcrSnapshot = namedtuple("OcrSnapshot", "max_distance entries")
+
+
+def fingerprint(crop):
+    '''
+    64 bit difference hash of a crop. The crop is shrunk to 9x8 grey pixels and each bit says
+    whether a pixel is brighter than its right neighbour, so small shifts, blur and JPEG noise
+    leave most bits alone while a different label flips many of them.
+    '''
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def keep_text(text, prob):
+    # Only confident, long enough strings can be a medicine name
+    return prob > 0.4 and len(text) > 3
+
+
+def preprocess_crop(crop, height=96):
+    '''Grey, fixed height, local contrast boosted, so every crop in a batch looks alike to EasyOCR.'''
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    scale = height / float(gray.shape[0])
+    width = max(1, int(round(gray.shape[1] * scale)))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    return _clahe.apply(cv2.resize(gray, (width, height), interpolation=interpolation))
+
+
+def _detect_batch(reader, images, height):
+    # readtext_batched needs one size for the whole batch, pad on the right instead of stretching
+    width = max(img.shape[1] for img in images)
+    padded = [cv2.copyMakeBorder(img, 0, 0, 0, width - img.shape[1], cv2.BORDER_REPLICATE) for img in images]
+    results = reader.readtext_batched(padded, n_width=width, n_height=height, batch_size=len(padded))
+    return [[text.upper() for (bbox, text, prob) in res if keep_text(text, prob)] for res in results]
+
+
+def _recognize_batch(reader, images, gap=8):
+    # Stack the crops into one strip and give the recogniser one box per crop, no text detection
+    width = max(img.shape[1] for img in images)
+    strip = np.full((sum(img.shape[0] + gap for img in images), width), 255, np.uint8)
+    boxes, starts, y = [], [], 0
+    for img in images:
+        h, w = img.shape[:2]
+        strip[y:y + h, :w] = img
+        boxes.append([0, w, y, y + h]) # x_min, x_max, y_min, y_max
+        starts.append(y)
+        y += h + gap
+
+    texts = [[] for _ in images]
+    results = reader.recognize(strip, horizontal_list=boxes, free_list=[], batch_size=len(images))
+    for bbox, text, prob in results:
+        index = max(0, bisect_right(starts, bbox[0][1]) - 1) # which crop the box came from
+        if keep_text(text, prob):
+            texts[index].append(text.upper())
+    return texts
+
+
+def read_batch(reader, crops, mode="detect", height=96):
+    '''
+    Read every crop with a single EasyOCR call. Returns one list of upper-cased, confident
+    strings per crop, in the same order.
+    '''
+    texts = [[] for _ in crops]
+    live = [i for i, crop in enumerate(crops) if crop is not None and crop.size > 0]
+    if not live:
+        return texts
+    images = [preprocess_crop(crops[i], height) for i in live]
+    if mode == "recognize":
+        read = _recognize_batch(reader, images)
+    else:
+        read = _detect_batch(reader, images, height)
+    for i, crop_texts in zip(live, read):
+        texts[i] = crop_texts
+    return texts
+
+
+def load_reader(gpu=True, languages=("en",), engine="easyocr", stub_ms=0.0):
+    '''
+    EasyOCR reader, on the CPU when there is no CUDA device or the GPU reader fails to load.
+    engine 'stub' returns a StubReader instead and never imports EasyOCR.
+    '''
+    if engine == "stub":
+        return StubReader(delay_ms=stub_ms)
+    import easyocr
+    if gpu:
+        try:
+            import torch
+            if torch.cuda.is_available():
+                return easyocr.Reader(list(languages), gpu=True)
+            log.info("No CUDA device, EasyOCR runs on the CPU")
+        except Exception as e:
+            log.warning("EasyOCR on the GPU failed, falling back to the CPU : %s", e)
+    return easyocr.Reader(list(languages), gpu=False)
+
+
+class StubReader:
+    '''
+    Stand-in for easyocr.Reader that reads text on every crop, for benchmarks and load tests.
+    delay_ms is slept per call to mimic EasyOCR's cost.
+    '''
+
+    def __init__(self, text="PARACETAMOL", delay_ms=0.0):
+        self.text = text
+        self.delay_ms = delay_ms
+
+    def _wait(self):
+        if self.delay_ms > 0:
+            time.sleep(self.delay_ms / 1000.0)
+
+    def readtext_batched(self, images, n_width=None, n_height=None, batch_size=1):
+        self._wait()
+        return [[(None, self.text, 0.9)] for _ in images]
+
+    def recognize(self, image, horizontal_list=(), free_list=(), batch_size=1):
+        self._wait()
+        return [([[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]], self.text, 0.9)
+                for x_min, x_max, y_min, y_max in horizontal_list]
+
+
+def warm_up(reader, mode="detect", height=96):
+    # One blank label through the same path real crops take
+    read_batch(reader, [np.full((height, height * 3, 3), 255, np.uint8)], mode=mode, height=height)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def lookup(snapshot, fp):
+    '''Cached texts for the closest fingerprint within max_distance bits, None on a miss.'''
+    if snapshot is None:
+        return None
+    best, best_distance = None, snapshot.max_distance + 1
+    for known, texts in snapshot.entries:
+        distance = hamming(known, fp)
+        if distance < best_distance:
+            best, best_distance = texts, distance
+    return best
+
+
+class OcrCache:
+    '''
+    Per-session OCR results keyed by crop fingerprint, bounded by size (oldest use evicted)
+    and by TTL. The runner only sees a snapshot, the session records what came back.
+    '''
+
+    def __init__(self, max_entries=32, ttl=30.0, max_distance=6):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._entries = OrderedDict() # fingerprint -> (texts, stored_at)
+        self.hits = 0
+        self.misses = 0
+
+    def _prune(self, now):
+        expired = [fp for fp, (texts, stored_at) in self._entries.items() if now - stored_at > self.ttl]
+        for fp in expired:
+            del self._entries[fp]
+
+    def snapshot(self):
+        self._prune(time.monotonic())
+        return OcrSnapshot(self.max_distance, tuple((fp, texts) for fp, (texts, _) in self._entries.items()))
+
+    def record(self, read):
+        if read.fingerprint is None:
+            return
+        if read.cached:
+            self.hits += 1
+            # Refresh recency only, the TTL still counts from when OCR actually ran
+            for fp, (texts, stored_at) in self._entries.items():
+                if texts == tuple(read.texts) and hamming(fp, read.fingerprint) <= self.max_distance:
+                    self._entries.move_to_end(fp)
+                    break
+            return
+        self.misses += 1
+        if not read.texts:
+            return # nothing readable, a sharper crop of the same label should still get a real OCR pass
+        self._entries[read.fingerprint] = (tuple(read.texts), time.monotonic())
+        self._entries.move_to_end(read.fingerprint)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+class OcrStage:
+    '''
+    OCR as its own pipeline stage with its own bounded queue and greenlets, so a frame reply
+    never waits on EasyOCR. There is at most one pending job per key (sid): a newer crop
+    replaces the stale one still waiting. When max_pending keys are already queued, new keys
+    are dropped and the next OCR frame for that session tries again.
+
+    read_fn takes a list of crops and returns one list of texts per crop, on_done(key, reads)
+    gets the finished OcrReads. Jobs from several sessions are merged until batch_crops crops
+    are collected, so read_fn can read them all in one EasyOCR call.
+    '''
+
+    def __init__(self, read_fn, on_done, max_pending=64, concurrency=1, spawn=None, batch_crops=16):
+        self.read_fn = read_fn
+        self.on_done = on_done
+        self.max_pending = max_pending
+        self.batch_crops = max(1, int(batch_crops))
+        self.concurrency = max(1, int(concurrency))
+        self._spawn = spawn
+        self._pending = OrderedDict() # key -> list of OcrRead misses, oldest key first
+        self._cond = threading.Condition()
+        self._workers = []
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.completed = 0
+        self.batches = 0
+
+    def start(self):
+        while len(self._workers) < self.concurrency:
+            if self._spawn is None:
+                worker = threading.Thread(target=self._run, daemon=True)
+                worker.start()
+            else:
+                worker = self._spawn(self._run) # e.g. socketio.start_background_task
+            self._workers.append(worker)
+
+    def submit(self, key, misses):
+        '''Queue the cache misses of one frame, False when the queue is full.'''
+        self.start()
+        with self._cond:
+            if key in self._pending:
+                self.coalesced += 1
+                del self._pending[key] # newest crop wins, and it goes to the back of the line
+            elif len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending[key] = misses
+            self.submitted += 1
+            self._cond.notify()
+        return True
+
+    def discard(self, key):
+        with self._cond:
+            self._pending.pop(key, None)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                jobs, crops = [], 0
+                while self._pending and (not jobs or crops + len(next(iter(self._pending.values()))) <= self.batch_crops):
+                    key, misses = self._pending.popitem(last=False)
+                    jobs.append((key, misses))
+                    crops += len(misses)
+            try:
+                texts = iter(self.read_fn([read.crop for key, misses in jobs for read in misses]))
+                for key, misses in jobs:
+                    self.on_done(key, [OcrRead(next(texts), read.fingerprint, False) for read in misses])
+            except Exception as e:
+                log.error("OCR error : %s", e)
+            finally:
+                self.batches += 1
+                self.completed += len(jobs)
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "completed": self.completed,
+            "batches": self.batches,
+        }
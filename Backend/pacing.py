@@ -0,0 +1,95 @@
+from collections import namedtuple
+
+# What capture_hint tells a client: how often to take a picture, the JPEG quality
+# (0..1, as takePictureAsync expects) and the longest side of the picture in pixels
+CaptureHint = namedtuple("CaptureHint", "interval_ms quality max_dimension")
+
+# Picture settings from best to cheapest, a session moves down this ladder under load
+QUALITY_LADDER = ((0.5, 640), (0.4, 512), (0.3, 400), (0.25, 320), (0.2, 256))
+
+
+class CaptureController:
+    '''
+    Per-session pacing, so clients speed up when the server is idle and slow down under load.
+
+    observe() is fed the end-to-end latency of every frame (raw_frame received -> reply sent,
+    queueing included) and the global queue pressure (0..1). Slowing down is immediate:
+    the interval grows by backoff and, once it is at max_interval_ms or the latency is far
+    over target, the picture gets cheaper. Speeding up needs calm_frames quiet frames in a row
+    and undoes one step at a time, picture quality first. The interval never goes below the
+    measured latency, a session only has one frame in flight anyway.
+    '''
+
+    def __init__(self, target_latency_ms=300, min_interval_ms=250, max_interval_ms=2000,
+                 start_interval_ms=1000, start_level=2, backoff=1.5, step_ms=100,
+                 high_pressure=0.5, low_pressure=0.1, calm_frames=3, smoothing=0.3):
+        self.target_latency_ms = target_latency_ms
+        self.min_interval_ms = min_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.backoff = backoff
+        self.step_ms = step_ms
+        self.high_pressure = high_pressure
+        self.low_pressure = low_pressure
+        self.calm_frames = calm_frames
+        self.smoothing = smoothing
+
+        self.interval_ms = float(start_interval_ms)
+        self.level = min(max(0, start_level), len(QUALITY_LADDER) - 1)
+        self.latency_ms = None # EWMA
+        self._calm = 0
+        self._sent = None
+
+    def hint(self):
+        quality, max_dimension = QUALITY_LADDER[self.level]
+        # Whole 50ms steps, so small latency wobbles do not send a new hint every frame
+        return CaptureHint(int(round(self.interval_ms / 50.0)) * 50, quality, max_dimension)
+
+    def _slow_down(self, severe):
+        self._calm = 0
+        at_max = self.interval_ms >= self.max_interval_ms
+        self.interval_ms = min(self.max_interval_ms, self.interval_ms * self.backoff)
+        if (at_max or severe) and self.level < len(QUALITY_LADDER) - 1:
+            self.level += 1
+
+    def _speed_up(self):
+        self._calm += 1
+        if self._calm < self.calm_frames:
+            return
+        self._calm = 0
+        if self.level > 0:
+            self.level -= 1
+        else:
+            self.interval_ms = max(self.min_interval_ms, self.interval_ms - self.step_ms)
+
+    def observe(self, latency_ms, pressure):
+        '''Record one finished frame. Returns the new CaptureHint when it changed, else None.'''
+        if self.latency_ms is None:
+            self.latency_ms = float(latency_ms)
+        else:
+            self.latency_ms += self.smoothing * (latency_ms - self.latency_ms)
+
+        if pressure >= self.high_pressure or self.latency_ms > self.target_latency_ms:
+            self._slow_down(severe=self.latency_ms > 2 * self.target_latency_ms)
+        elif pressure <= self.low_pressure and self.latency_ms < self.target_latency_ms / 2:
+            self._speed_up()
+        else:
+            self._calm = 0
+        self.interval_ms = max(self.interval_ms, min(self.latency_ms, self.max_interval_ms))
+        return self._changed()
+
+    def shed(self):
+        '''The frame was dropped by admission control, back off hard.'''
+        self._slow_down(severe=True)
+        return self._changed()
+
+    def announce(self):
+        '''The current hint, e.g. for a client that just connected.'''
+        self._sent = self.hint()
+        return self._sent
+
+    def _changed(self):
+        hint = self.hint()
+        if hint == self._sent:
+            return None
+        self._sent = hint
+        return hint
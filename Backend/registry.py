@@ -0,0 +1,80 @@
+import logging
+import threading
+import time
+
+log = logging.getLogger("medaware.registry")
+
+
+class _Model:
+    __slots__ = ("loader", "warmup", "model", "state", "load_ms", "warmup_ms", "error", "lock")
+
+    def __init__(self, loader, warmup):
+        self.loader = loader
+        self.warmup = warmup
+        self.model = None
+        self.state = "unloaded" # -> loading -> ready (or failed)
+        self.load_ms = None
+        self.warmup_ms = None
+        self.error = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    '''
+    Models by name, loaded on first use instead of at import, so a process that never sees
+    a frame never imports torch, ultralytics or easyocr. warm_up() loads them ahead of time
+    and runs one throwaway inference each, so the first real frame does not pay for the
+    cold start (CUDA context, kernel selection, lazy allocations).
+    '''
+
+    def __init__(self):
+        self._models = {}
+
+    def register(self, name, loader, warmup=None):
+        '''loader() builds the model, warmup(model) runs one dummy inference on it.'''
+        self._models[name] = _Model(loader, warmup)
+
+    def get(self, name):
+        entry = self._models[name]
+        if entry.model is not None:
+            return entry.model
+        with entry.lock: # a second caller waits for the first load instead of loading twice
+            if entry.model is None:
+                entry.state = "loading"
+                start = time.monotonic()
+                try:
+                    entry.model = entry.loader()
+                except Exception as e:
+                    entry.state = "failed"
+                    entry.error = repr(e)
+                    raise
+                entry.load_ms = round((time.monotonic() - start) * 1000, 1)
+                entry.state = "ready"
+                log.info("Model %s loaded in %sms", name, entry.load_ms)
+        return entry.model
+
+    def warm_up(self, names=None):
+        for name in names or list(self._models):
+            entry = self._models[name]
+            try:
+                model = self.get(name)
+                if entry.warmup is not None and entry.warmup_ms is None:
+                    start = time.monotonic()
+                    entry.warmup(model)
+                    entry.warmup_ms = round((time.monotonic() - start) * 1000, 1)
+                    log.info("Model %s warmed up in %sms", name, entry.warmup_ms)
+            except Exception as e:
+                log.error("Warm-up of %s failed : %s", name, e)
+
+    def stats(self):
+        stats = {}
+        for name, entry in self._models.items():
+            device = getattr(entry.model, "device", None)
+            stats[name] = {
+                "state": entry.state,
+                "device": str(device) if device is not None else None,
+                "load_ms": entry.load_ms,
+                "warmup_ms": entry.warmup_ms,
+                "error": entry.error,
+            }
+        return stats
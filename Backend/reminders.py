@@ -0,0 +1,197 @@
+'''
+Server side reminder scheduling. Every reminder fires twice a day: at its rtime (on_due, main.py
+pushes reminder_due to the user's sids) and grace seconds later (on_expired, main.py logs Missed
+if nothing was logged for the dose by then), so a dose is recorded even when the app was killed.
+
+The reminders table is never polled. It is read one slice of rtime at a time, window seconds
+ahead of the clock (an index range scan on reminders.rtime, paged by (rtime, rid)), and only
+what falls in [now - grace, now + window] is held in memory, in a timer wheel with one slot per
+tick. A few million reminders spread over the day are a few thousand entries at any moment.
+add_reminder hands new rows to add(), in case their time is in a slice that was already read.
+
+Every node may run one: the callbacks decide who acts on an entry (main.py claims each one in
+the shared state backend), so losing a node loses nothing but the reminders added on it that
+were due before the others read them from the database.
+'''
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, time as dtime
+
+# One dose of one reminder, day is the date its Reminder_Log row is filed under
+DueDose = namedtuple("DueDose", "uid rid day due_at")
+
+
+class TimerWheel:
+    '''Entries bucketed by tick, add and fire are O(1) per entry.'''
+
+    def __init__(self, tick=1.0):
+        self.tick = tick
+        self._slots = {} # int(ts / tick) -> [entry, ...]
+        self._fired = None # last slot handed out
+        self.size = 0
+
+    def add(self, ts, entry):
+        slot = int(ts // self.tick)
+        if self._fired is not None and slot <= self._fired:
+            slot = self._fired + 1 # already behind the clock, goes out on the next tick
+        self._slots.setdefault(slot, []).append(entry)
+        self.size += 1
+
+    def pop_due(self, now):
+        '''Every entry whose slot is at or before now.'''
+        current = int(now // self.tick)
+        if self._fired is None:
+            self._fired = min(min(self._slots, default=current), current) - 1
+        due = []
+        for slot in range(self._fired + 1, current + 1):
+            entries = self._slots.pop(slot, None)
+            if entries:
+                due.extend(entries)
+        self._fired = max(self._fired, current)
+        self.size -= len(due)
+        return due
+
+
+class ReminderScheduler:
+    '''
+    load_fn(start, end, after, limit) -> [(rid, uid, rtime), ...] reads reminders with
+    start <= rtime < end (end None for up to midnight) ordered by (rtime, rid), after the
+    (rtime, rid) of the previous page when there is one.
+    on_due(entries) and on_expired(entries) get lists of DueDose.
+    '''
+
+    def __init__(self, load_fn, on_due, on_expired, grace=1800, window=600, tick=1.0, page_size=5000,
+                 spawn=None, sleep=time.sleep, clock=time.time, on_error=None):
+        self.load_fn = load_fn
+        self.on_due = on_due
+        self.on_expired = on_expired
+        self.grace = grace
+        self.window = window
+        self.page_size = page_size
+        self.sleep = sleep
+        self.clock = clock # wall clock, rtime is a time of day
+        self.on_error = on_error
+        self._spawn = spawn
+        self._wheel = TimerWheel(tick)
+        self._scheduled = set() # (kind, rid, day) in the wheel, so a reminder is never queued twice
+        self._loaded_from = None # due times in [_loaded_from, _loaded_until) have been read
+        self._loaded_until = None
+        self._loop = None
+
+        self.loads = 0
+        self.rows = 0
+        self.due = 0
+        self.expired = 0
+
+    def start(self):
+        if self._loop is not None:
+            return
+        if self._spawn is None:
+            self._loop = threading.Thread(target=self._run, daemon=True)
+            self._loop.start()
+        else:
+            self._loop = self._spawn(self._run) # e.g. socketio.start_background_task
+
+    def _at(self, ts):
+        return datetime.fromtimestamp(ts)
+
+    def _schedule(self, rid, uid, due_at, now):
+        day = due_at.date()
+        due_ts = due_at.timestamp()
+        if due_ts >= now and ("due", rid, day) not in self._scheduled:
+            self._scheduled.add(("due", rid, day))
+            self._wheel.add(due_ts, ("due", DueDose(uid, rid, day, due_at)))
+        if due_ts + self.grace >= now and ("expired", rid, day) not in self._scheduled:
+            self._scheduled.add(("expired", rid, day))
+            self._wheel.add(due_ts + self.grace, ("expired", DueDose(uid, rid, day, due_at)))
+
+    def add(self, rid, uid, rtime):
+        '''A reminder written after its slice was read, scheduled now if it falls in what was read.'''
+        if not isinstance(rtime, dtime) or self._loaded_from is None:
+            return
+        now = self.clock()
+        today = self._at(now).date()
+        for day in (today - timedelta(days=1), today, today + timedelta(days=1)):
+            due_at = datetime.combine(day, rtime)
+            if self._loaded_from <= due_at < self._loaded_until:
+                self._schedule(rid, uid, due_at, now)
+
+    def _load(self, start, end):
+        '''Read the reminders due in [start, end), split at midnight, page by page.'''
+        now = self.clock()
+        pieces = []
+        if start.date() == end.date():
+            pieces.append((start.date(), start.time(), end.time()))
+        else:
+            pieces.append((start.date(), start.time(), None))
+            day = start.date() + timedelta(days=1)
+            while day < end.date():
+                pieces.append((day, dtime(0), None)) # only with a window over a day long
+                day += timedelta(days=1)
+            if end.time() != dtime(0):
+                pieces.append((end.date(), dtime(0), end.time()))
+        for day, low, high in pieces:
+            after = None
+            while True:
+                rows = self.load_fn(low, high, after, self.page_size)
+                self.loads += 1
+                self.rows += len(rows)
+                for rid, uid, rtime in rows:
+                    self._schedule(rid, uid, datetime.combine(day, rtime), now)
+                if len(rows) < self.page_size:
+                    break
+                after = (rows[-1][2], rows[-1][0])
+                self.sleep(0) # let the frames through between pages
+        self._loaded_until = end
+
+    def _fire(self, kind, handler, entries):
+        for dose in entries:
+            self._scheduled.discard((kind, dose.rid, dose.day))
+        try:
+            handler(entries)
+        except Exception as e:
+            if self.on_error is not None:
+                self.on_error(kind, e)
+
+    def run_once(self):
+        '''Read ahead if needed and fire whatever is due, the loop calls it every tick.'''
+        now = self.clock()
+        if self._loaded_until is None:
+            # Doses due in the last grace seconds may still need their Missed log, after a restart too
+            self._loaded_from = self._loaded_until = self._at(now - self.grace).replace(microsecond=0)
+        horizon = self._at(now + self.window)
+        while self._loaded_until < horizon:
+            self._load(self._loaded_until, self._loaded_until + timedelta(seconds=self.window))
+        # The oldest due time still in the wheel is grace behind the clock
+        self._loaded_from = max(self._loaded_from, self._at(now - self.grace))
+
+        due, expired = [], []
+        for kind, dose in self._wheel.pop_due(now):
+            (due if kind == "due" else expired).append(dose)
+        if due:
+            self.due += len(due)
+            self._fire("due", self.on_due, due)
+        if expired:
+            self.expired += len(expired)
+            self._fire("expired", self.on_expired, expired)
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                # Usually the database, the same slice is read again on the next tick
+                if self.on_error is not None:
+                    self.on_error("load", e)
+            self.sleep(self._wheel.tick)
+
+    def stats(self):
+        return {
+            "pending": self._wheel.size,
+            "loaded_until": self._loaded_until.isoformat() if self._loaded_until else None,
+            "loads": self.loads,
+            "rows": self.rows,
+            "due": self.due,
+            "expired": self.expired,
+        }
@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+log = logging.getLogger("medaware.scheduler")
+
+
+class _QueuedFrame:
+    __slots__ = ("key", "item", "priority", "enqueued")
+
+    def __init__(self, key, item, priority):
+        self.key = key
+        self.item = item
+        self.priority = priority
+        self.enqueued = time.monotonic()
+
+
+class FrameScheduler:
+    '''
+    Global admission control in front of the frame pipeline. Every raw_frame is submitted
+    here instead of getting its own background task, and at most max_running frames are
+    processed at once across all sessions.
+
+    - The queue is bounded by max_queue. A full queue sheds the new frame and on_shed(key, info)
+      is called so the client can be told to back off.
+    - There is at most one queued frame per key (sid): a newer frame replaces the queued one but
+      keeps its place in line, so every session gets one turn per round (round-robin).
+    - Priority frames (sessions close to verification) are taken first, but after priority_burst
+      of them in a row a normal frame gets a turn so nobody starves. When the queue is full a
+      priority frame pushes out the newest normal one instead of being shed.
+
+    run_fn(key, item) runs in one of max_running background tasks.
+    '''
+
+    def __init__(self, run_fn, on_shed=None, max_queue=32, max_running=8, priority_burst=3, spawn=None, samples=256):
+        self.run_fn = run_fn
+        self.on_shed = on_shed
+        self.max_queue = max(1, int(max_queue))
+        self.max_running = max(1, int(max_running))
+        self.priority_burst = max(1, int(priority_burst))
+        self._spawn = spawn
+        self._queues = {True: OrderedDict(), False: OrderedDict()} # priority -> key -> _QueuedFrame
+        self._cond = threading.Condition()
+        self._workers = []
+        self._burst = 0
+        self._waits = deque(maxlen=samples) # seconds spent queued, most recent frames
+        self.running = 0
+
+        self.admitted = 0
+        self.replaced = 0
+        self.shed = 0
+        self.completed = 0
+
+    def start(self):
+        while len(self._workers) < self.max_running:
+            if self._spawn is None:
+                worker = threading.Thread(target=self._run, daemon=True)
+                worker.start()
+            else:
+                worker = self._spawn(self._run) # e.g. socketio.start_background_task
+            self._workers.append(worker)
+
+    def depth(self):
+        return len(self._queues[True]) + len(self._queues[False])
+
+    def submit(self, key, item, priority=False):
+        '''Queue a frame for key, False when it was shed.'''
+        self.start()
+        with self._cond:
+            queued = self._queues[True].get(key) or self._queues[False].get(key)
+            if queued is not None:
+                # Freshest frame wins, the turn it already waited for is kept
+                queued.item = item
+                if priority and not queued.priority:
+                    del self._queues[False][key]
+                    queued.priority = True
+                    self._queues[True][key] = queued
+                self.replaced += 1
+                return True
+            shed = None
+            if self.depth() >= self.max_queue:
+                if not priority or not self._queues[False]:
+                    self.shed += 1
+                    shed = (key, self._shed_info())
+                else:
+                    # The newest normal frame has waited the least, it makes room
+                    victim, _ = self._queues[False].popitem(last=True)
+                    self.shed += 1
+                    shed = (victim, self._shed_info())
+            if shed is None or shed[0] != key:
+                self._queues[priority][key] = _QueuedFrame(key, item, priority)
+                self.admitted += 1
+                self._cond.notify()
+        if shed is not None and self.on_shed is not None:
+            self.on_shed(*shed)
+        return shed is None or shed[0] != key
+
+    def discard(self, key):
+        with self._cond:
+            self._queues[True].pop(key, None)
+            self._queues[False].pop(key, None)
+
+    def _shed_info(self):
+        return {"queue_depth": self.depth(), "wait_ms": round(self._avg_wait() * 1000)}
+
+    def _avg_wait(self):
+        return (sum(self._waits) / len(self._waits)) if self._waits else 0.0
+
+    def _next(self):
+        with self._cond:
+            while not self._queues[True] and not self._queues[False]:
+                self._cond.wait()
+            take_priority = bool(self._queues[True]) and (
+                self._burst < self.priority_burst or not self._queues[False])
+            self._burst = self._burst + 1 if take_priority else 0
+            key, queued = self._queues[take_priority].popitem(last=False)
+            self._waits.append(time.monotonic() - queued.enqueued)
+            self.running += 1
+            return queued
+
+    def _run(self):
+        while True:
+            queued = self._next()
+            try:
+                self.run_fn(queued.key, queued.item)
+            except Exception as e:
+                log.error("Scheduler error : %s", e)
+            finally:
+                self.running -= 1
+                self.completed += 1
+
+    def stats(self):
+        waits = sorted(self._waits)
+        return {
+            "queue_depth": self.depth(),
+            "priority_depth": len(self._queues[True]),
+            "running": self.running,
+            "admitted": self.admitted,
+            "replaced": self.replaced,
+            "shed": self.shed,
+            "completed": self.completed,
+            "wait_ms_avg": round(self._avg_wait() * 1000, 1),
+            "wait_ms_p95": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+            "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+        }
@@ -0,0 +1,14 @@
+'''
+Starts the server:
+
+    python server.py        (python main.py does the same, it hands over to this file)
+
+main.py sets the app up when it is imported. The inference workers (INFERENCE_MODE = 'process')
+are spawned, and spawn re-imports the parent's __main__ file in every worker, so with main.py as
+__main__ each worker would set the whole app up again: monkey patching, create_all and the
+migrations, Flask-Session, SocketIO and the state backend. With this file as __main__ a worker
+re-imports only these lines, then the workers.py (engines, ocr, vision) it runs.
+'''
+if __name__ == "__main__":
+    import main
+    main.run()
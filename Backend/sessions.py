@@ -0,0 +1,185 @@
+import sys
+import threading
+import time
+
+
+class VoteBuffer:
+    '''
+    The last `capacity` OCR strings in a fixed ring, with running counts so the leader is
+    known without rebuilding a Counter on every update (replaces buffer.pop(0) + Counter).
+    '''
+    __slots__ = ("capacity", "_ring", "_next", "_size", "counts", "leader")
+
+    def __init__(self, capacity=10):
+        self.capacity = capacity
+        self._ring = [None] * capacity
+        self._next = 0
+        self._size = 0
+        self.counts = {}
+        self.leader = None
+
+    def __len__(self):
+        return self._size
+
+    def push(self, text):
+        evicted = self._ring[self._next]
+        if self._size == self.capacity:
+            left = self.counts[evicted] - 1
+            if left:
+                self.counts[evicted] = left
+            else:
+                del self.counts[evicted]
+        else:
+            self._size += 1
+        self._ring[self._next] = text
+        self._next = (self._next + 1) % self.capacity
+        self.counts[text] = self.counts.get(text, 0) + 1
+
+        if self.leader is None or self.leader not in self.counts:
+            self.leader = max(self.counts, key=self.counts.get)
+        elif text != self.leader and self.counts[text] > self.counts[self.leader]:
+            self.leader = text
+        elif evicted == self.leader and evicted != text:
+            # The leader lost a vote, someone else may be ahead now (at most `capacity` keys)
+            self.leader = max(self.counts, key=self.counts.get)
+
+    def extend(self, texts):
+        for text in texts:
+            self.push(text)
+
+    def approx_bytes(self):
+        return (sys.getsizeof(self._ring) + sys.getsizeof(self.counts)
+                + sum(sys.getsizeof(text) for text in self.counts))
+
+
+class VisionState:
+    '''Everything the vision pipeline remembers about one scanning session.'''
+    __slots__ = ("counter", "ocr_frame", "votes", "display_name", "is_logged", "name_confirmed",
+                 "tracker", "frame_size", "ocr_cache", "patient_uid", "rid", "medicine_index", "gate")
+
+    def __init__(self, tracker, ocr_cache, vote_capacity=10, gate=None):
+        self.counter = 0 # frame counter
+        self.ocr_frame = 0 # counter value of the last frame that went to OCR
+        self.votes = VoteBuffer(vote_capacity)
+        self.display_name = "Scanning..."
+        self.is_logged = False # verification lock, a dose is only logged once
+        self.name_confirmed = False # display_name came from a confident match against the prescription
+        self.tracker = tracker
+        self.frame_size = None # (width, height) of the last decoded frame
+        self.ocr_cache = ocr_cache
+        self.patient_uid = None
+        self.rid = None # the reminder being verified
+        self.medicine_index = None # shared per user, not counted in approx_bytes
+        self.gate = gate # DuplicateGate, reuses the last result while the picture does not change
+
+    def approx_bytes(self):
+        size = sys.getsizeof(self) + self.votes.approx_bytes() + sys.getsizeof(self.display_name)
+        size += sum(sys.getsizeof(track) for track in self.tracker.tracks)
+        size += sys.getsizeof(self.ocr_cache._entries)
+        for texts, stored_at in self.ocr_cache._entries.values():
+            size += sys.getsizeof(texts) + sum(sys.getsizeof(text) for text in texts)
+        if self.gate is not None and self.gate._result is not None and self.gate._result.jpeg is not None:
+            size += len(self.gate._result.jpeg) # the annotated frame kept for reuse
+        return size
+
+
+class SessionState:
+    '''One Socket.IO connection: negotiated options, the busy flag and its vision state.'''
+    __slots__ = ("sid", "frame_protocol", "overlay", "busy", "last_seen", "vision", "pacing", "uid")
+
+    def __init__(self, sid, frame_protocol, overlay, pacing=None):
+        self.sid = sid
+        self.frame_protocol = frame_protocol
+        self.overlay = overlay
+        self.busy = False # a frame of this sid is being processed
+        self.last_seen = time.monotonic()
+        self.vision = None
+        self.pacing = pacing # CaptureController, kept when the vision state is evicted
+        self.uid = None # the logged in user whose cookie came with the handshake, for presence
+
+    def approx_bytes(self):
+        size = sys.getsizeof(self) + sys.getsizeof(self.sid)
+        if self.vision is not None:
+            size += self.vision.approx_bytes()
+        return size
+
+
+class SessionStore:
+    '''
+    Per-sid state, replacing the user_states / processing_status dicts. Records are removed
+    on disconnect; the (much bigger) vision state of a session that has not sent a frame for
+    idle_ttl seconds is dropped by the reaper and rebuilt if the client starts scanning again.
+    '''
+
+    def __init__(self, vision_factory, idle_ttl=300, pacing_factory=None):
+        self.vision_factory = vision_factory
+        self.pacing_factory = pacing_factory
+        self.idle_ttl = idle_ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self._reaper = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def open(self, sid, frame_protocol, overlay):
+        pacing = self.pacing_factory() if self.pacing_factory is not None else None
+        session = SessionState(sid, frame_protocol, overlay, pacing)
+        with self._lock:
+            self._sessions[sid] = session
+        return session
+
+    def get(self, sid):
+        return self._sessions.get(sid)
+
+    def close(self, sid):
+        with self._lock:
+            return self._sessions.pop(sid, None)
+
+    def vision(self, session):
+        '''The session's vision state, created on its first frame or after it was evicted.'''
+        session.last_seen = time.monotonic()
+        if session.vision is None:
+            session.vision = self.vision_factory()
+        return session.vision
+
+    def sessions(self):
+        return list(self._sessions.values())
+
+    def busy_count(self):
+        return sum(1 for session in self._sessions.values() if session.busy)
+
+    def evict_idle(self, now=None):
+        now = time.monotonic() if now is None else now
+        evicted = []
+        for session in self.sessions():
+            if session.vision is not None and not session.busy and now - session.last_seen > self.idle_ttl:
+                session.vision = None
+                evicted.append(session.sid)
+        self.evicted += len(evicted)
+        return evicted
+
+    def start_reaper(self, spawn, sleep, interval=30, on_evict=None):
+        '''Run evict_idle every `interval` seconds, on_evict(sid) is told about each eviction.'''
+        if self._reaper is not None:
+            return
+
+        def reap():
+            while True:
+                sleep(interval)
+                for sid in self.evict_idle():
+                    if on_evict is not None:
+                        on_evict(sid)
+
+        self._reaper = spawn(reap)
+
+    def memory_usage(self):
+        sessions = self.sessions()
+        return {
+            "sessions": len(sessions),
+            "scanning": sum(1 for session in sessions if session.vision is not None),
+            "busy": sum(1 for session in sessions if session.busy),
+            "evicted": self.evicted,
+            "approx_bytes": sum(session.approx_bytes() for session in sessions),
+        }
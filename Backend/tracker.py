@@ -0,0 +1,133 @@
+import itertools
+
+from vision import Detection
+
+_track_ids = itertools.count(1)
+
+
+def iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+class Track:
+    __slots__ = ("track_id", "class_id", "box", "detected_box", "velocity", "conf", "misses")
+
+    def __init__(self, det):
+        self.track_id = next(_track_ids)
+        self.class_id = det.class_id
+        self.box = tuple(float(v) for v in det.box)
+        self.detected_box = self.box # where the detector last saw it, box is the prediction
+        self.velocity = (0.0, 0.0)
+        self.conf = det.conf
+        self.misses = 0
+
+    def correct(self, det, frames):
+        # Centre velocity per frame, measured over the frames since the last detection
+        old = self.detected_box
+        old_cx, old_cy = (old[0] + old[2]) / 2, (old[1] + old[3]) / 2
+        new_cx, new_cy = (det.box[0] + det.box[2]) / 2, (det.box[1] + det.box[3]) / 2
+        self.velocity = ((new_cx - old_cx) / frames, (new_cy - old_cy) / frames)
+        self.box = self.detected_box = tuple(float(v) for v in det.box)
+        self.conf = det.conf
+        self.misses = 0
+
+    def advance(self, decay):
+        dx, dy = self.velocity
+        x1, y1, x2, y2 = self.box
+        self.box = (x1 + dx, y1 + dy, x2 + dx, y2 + dy)
+        self.conf *= decay
+
+    def detection(self):
+        return Detection(self.class_id, tuple(int(round(v)) for v in self.box), self.conf, self.track_id)
+
+
+class IoUTracker:
+    '''
+    Per-session tracker so YOLO only runs on keyframes. Detections are matched to tracks by
+    IoU (same class only), each track keeps a constant-velocity motion estimate, and between
+    keyframes the boxes are moved along it while their confidence decays.
+
+    A full detection is asked for when keyframe_interval frames have passed, when any track
+    has decayed below min_confidence, or when there is nothing to track.
+
+    A track the last keyframe did not see is kept for max_misses keyframes so it gets its id
+    back if it reappears, but predict() leaves it out: in-between frames only ever report what
+    the detector confirmed on the last keyframe, main.py verifies a dose from those boxes.
+    '''
+
+    def __init__(self, keyframe_interval=5, min_confidence=0.35, iou_threshold=0.3, decay=0.85, max_misses=2):
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.min_confidence = min_confidence
+        self.iou_threshold = iou_threshold
+        self.decay = decay
+        self.max_misses = max_misses
+        self.tracks = []
+        self.since_keyframe = 0
+
+    def _live(self):
+        return [t for t in self.tracks if t.misses == 0]
+
+    def needs_detection(self):
+        live = self._live()
+        if not live or self.since_keyframe + 1 >= self.keyframe_interval:
+            return True
+        return any(t.conf * self.decay < self.min_confidence for t in live)
+
+    def predict(self):
+        '''Boxes for an in-between frame, taken from the motion model instead of the detector.'''
+        self.since_keyframe += 1
+        live = self._live()
+        for track in live:
+            track.advance(self.decay)
+        return [t.detection() for t in live]
+
+    def update(self, detections):
+        '''
+        Feed the detector output of a keyframe. Returns the same detections in the same
+        order with their track_id filled in.
+        '''
+        frames = self.since_keyframe + 1
+        self.since_keyframe = 0
+
+        # Greedy association, best IoU first
+        pairs = []
+        for ti, track in enumerate(self.tracks):
+            for di, det in enumerate(detections):
+                if det.class_id == track.class_id:
+                    overlap = iou(track.box, det.box)
+                    if overlap >= self.iou_threshold:
+                        pairs.append((overlap, ti, di))
+        pairs.sort(reverse=True)
+
+        matched_tracks, assigned = set(), {}
+        for overlap, ti, di in pairs:
+            if ti in matched_tracks or di in assigned:
+                continue
+            self.tracks[ti].correct(detections[di], frames)
+            matched_tracks.add(ti)
+            assigned[di] = self.tracks[ti]
+
+        survivors = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+
+        tracked = []
+        for di, det in enumerate(detections):
+            track = assigned.get(di)
+            if track is None:
+                track = Track(det)
+                survivors.append(track)
+            tracked.append(det._replace(track_id=track.track_id))
+        self.tracks = survivors
+        return tracked
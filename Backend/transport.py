@@ -0,0 +1,76 @@
+import base64
+
+# Frame protocols a connection can negotiate. Older clients never ask, so they stay on base64.
+BASE64 = "base64" # frames are 'data:image/jpeg;base64,...' strings both ways
+BINARY = "binary" # frames are raw JPEG bytes sent as Socket.IO binary attachments
+
+PROTOCOLS = (BASE64, BINARY)
+
+# What comes back for each frame
+OVERLAY_IMAGE = "image"       # annotated_frame, the server draws the boxes and re-encodes the JPEG
+OVERLAY_METADATA = "metadata" # frame_detections, a small JSON payload the client draws itself
+
+OVERLAYS = (OVERLAY_IMAGE, OVERLAY_METADATA)
+
+
+def negotiate(auth):
+    '''
+    Pick the frame protocol from the Socket.IO connect auth payload,
+    e.g. io(url, {auth: {frame_protocol: 'binary'}}).
+    '''
+    if isinstance(auth, dict) and auth.get("frame_protocol") in PROTOCOLS:
+        return auth["frame_protocol"]
+    return BASE64
+
+
+def negotiate_overlay(auth):
+    '''Overlay mode from the connect auth payload, e.g. {auth: {overlay: 'metadata'}}.'''
+    if isinstance(auth, dict) and auth.get("overlay") in OVERLAYS:
+        return auth["overlay"]
+    return OVERLAY_IMAGE
+
+
+def frame_bytes(frame_data):
+    '''
+    JPEG bytes out of a raw_frame payload. Binary attachments are handed back as they are,
+    np.frombuffer reads them later without another copy.
+    '''
+    if isinstance(frame_data, (bytes, bytearray, memoryview)):
+        return frame_data
+    # If the string contains the 'data:image/jpeg;base64,' prefix, skip it
+    comma = frame_data.find(",")
+    if comma != -1:
+        frame_data = frame_data[comma + 1:]
+    return base64.b64decode(frame_data)
+
+
+def frame_payload(jpeg, protocol):
+    '''annotated_frame payload for the connection's protocol.'''
+    if protocol == BINARY:
+        return jpeg
+    # .b64encode() converts bytes to base64 bytes
+    # .decode('utf-8') converts base64 bytes to a string
+    return f"data:image/jpeg;base64,{base64.b64encode(jpeg).decode('utf-8')}"
+
+
+def detections_payload(result, display_name, verified):
+    '''
+    frame_detections payload. Boxes are normalised to 0..1 of the received frame so the
+    client can scale them onto whatever preview size it shows.
+    '''
+    w, h = result.size
+    boxes, classes, scores, tracks = [], [], [], []
+    for det in result.detections:
+        x1, y1, x2, y2 = det.box
+        boxes.append([round(x1 / w, 3), round(y1 / h, 3), round(x2 / w, 3), round(y2 / h, 3)])
+        classes.append(det.class_id)
+        scores.append(round(det.conf, 2))
+        tracks.append(det.track_id)
+    return {
+        "boxes": boxes,
+        "classes": classes,
+        "scores": scores,
+        "tracks": tracks,
+        "display_name": display_name,
+        "verified": verified,
+    }
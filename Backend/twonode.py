@@ -0,0 +1,204 @@
+'''
+Two nodes on one machine, sharing a localhub.py hub in place of Redis, and checks that what has
+to agree across nodes does. Needs no Redis, no MySQL and no model weights:
+
+    python twonode.py
+
+starts the hub and two main.py nodes (stub models, one scratch sqlite database), then
+
+1. routed emit: a user logs in and connects to node b only, and a reminder due a few seconds
+   later is added on node a. Node a's scheduler claims it and emits reminder_due to the user's
+   sids. It finds them in the shared presence set, and the message queue delivers on node b.
+2. lock contention: the same user connects once to each node and both scan that reminder until
+   they are told verified. Exactly one logs the dose, the other gets log "already".
+
+The database and the node logs live in a temporary directory, removed afterwards unless --keep.
+Exits with 1 when a check fails.
+'''
+import argparse
+import http.cookiejar
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+import socketio
+
+from bench_vision import synthetic_frames
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class Node:
+    def __init__(self, name, port, env, workdir):
+        self.name = name
+        self.url = f"http://127.0.0.1:{port}"
+        self.log_path = os.path.join(workdir, f"node-{name}.log")
+        self.cookies = http.cookiejar.CookieJar() # its own login session, like one phone
+        self._opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        with open(self.log_path, "w") as log:
+            self.process = subprocess.Popen(
+                [sys.executable, "main.py"], cwd=HERE, stdout=log, stderr=subprocess.STDOUT,
+                env=dict(env, MEDAWARE_PORT=str(port), MEDAWARE_NODE_ID=f"node-{name}"))
+
+    def request(self, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.url + path, data, {"Content-Type": "application/json"})
+        try:
+            with self._opener.open(request, timeout=10) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return json.loads(e.read() or b"{}")
+
+    def wait_ready(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                if self.request("/stats")["startup"]["ready_ms"] is not None:
+                    return True
+            except (OSError, ValueError):
+                pass
+            time.sleep(0.5)
+        return False
+
+    def connect(self, uid, events):
+        '''A socket with this node's login cookie, every event it gets is appended to events.'''
+        sio = socketio.Client(reconnection=False)
+        for event in ("reminder_due", "reminder_missed", "verified", "app_error"):
+            sio.on(event, (lambda event: lambda data=None: events.append((event, data)))(event))
+        cookie = "; ".join(f"{c.name}={c.value}" for c in self.cookies)
+        sio.connect(self.url, headers={"Cookie": cookie}, transports=["websocket"], wait_timeout=10,
+                    auth={"uid": uid, "overlay": "metadata", "frame_protocol": "binary"})
+        return sio
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def wait_for(events, name, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for event, data in list(events):
+            if event == name:
+                return data
+        time.sleep(0.1)
+    return None
+
+
+def scan(sio, events, uid, rid, frames, timeout):
+    '''Send frames until verified, returns its log ("queued", "logged" or "already") or None.'''
+    deadline = time.monotonic() + timeout
+    position = 0
+    while time.monotonic() < deadline:
+        verified = [data for event, data in list(events) if event == "verified"]
+        if verified:
+            return verified[0].get("log")
+        sio.emit("raw_frame", {"uid": uid, "rid": rid, "frame": frames[position % len(frames)]})
+        position += 1
+        time.sleep(0.2)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hub-port", type=int, default=6390)
+    parser.add_argument("--ports", default="8081,8082", help="of node a and node b")
+    parser.add_argument("--due-in", type=float, default=5, help="seconds until the reminder of check 1 is due")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds each node gets to start, and each check")
+    parser.add_argument("--keep", action="store_true", help="leave the database and the node logs behind")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="twonode-")
+    hub_url = f"local://127.0.0.1:{args.hub_port}"
+    env = dict(os.environ,
+               MEDAWARE_DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'twonode.db')}",
+               MEDAWARE_STATE_BACKEND=hub_url,
+               MEDAWARE_MESSAGE_QUEUE=hub_url,
+               MEDAWARE_ENGINE="stub",
+               MEDAWARE_OCR_ENGINE="stub",
+               MEDAWARE_DEBUG="0")
+    with open(os.path.join(workdir, "hub.log"), "w") as log:
+        hub = subprocess.Popen([sys.executable, "localhub.py", "--port", str(args.hub_port)],
+                               cwd=HERE, stdout=log, stderr=subprocess.STDOUT)
+    nodes, clients, failures = [], [], []
+    try:
+        port_a, port_b = (int(port) for port in args.ports.split(","))
+        # One after the other, so only the first creates the tables
+        for name, port in (("a", port_a), ("b", port_b)):
+            node = Node(name, port, env, workdir)
+            nodes.append(node)
+            if not node.wait_ready(args.timeout):
+                raise SystemExit(f"Node {name} did not start, see {node.log_path}")
+        node_a, node_b = nodes
+
+        account = {"email": "twonode@loadtest.invalid", "password": "twonode"}
+        uid = node_b.request("/register", account).get("uid")
+        node_a.request("/login", account)
+        node_b.request("/login", account)
+        due_at = datetime.now() + timedelta(seconds=args.due_in)
+        rid = node_a.request("/add_reminder", {"uid": uid, "rtime": due_at.strftime("%H:%M:%S")}).get("rid")
+        node_a.request("/add_medicine", {"uid": uid, "rid": rid, "mname": "Paracetamol", "dose_qty": 1, "total_qty": 30})
+        if uid is None or rid is None:
+            raise SystemExit("Could not seed the user and the reminder")
+
+        events_b = []
+        clients.append(node_b.connect(uid, events_b))
+        due = wait_for(events_b, "reminder_due", args.due_in + args.timeout)
+        due_counts = {node.name: node.request("/stats")["reminder_scheduler"]["due"] for node in nodes}
+        if due is None or due.get("rid") != rid:
+            failures.append("routed emit: reminder_due never reached the client on node b")
+        print(f"1. routed emit: reminder_due {'received' if due else 'missing'} on node b, "
+              f"doses fired per node {due_counts}")
+
+        frames = synthetic_frames(20, 400, 30, seed=7)
+        events_a = []
+        clients.append(node_a.connect(uid, events_a))
+        logs = {}
+
+        def scan_on(name, sio, events):
+            logs[name] = scan(sio, events, uid, rid, frames, args.timeout)
+
+        scans = [threading.Thread(target=scan_on, args=("a", clients[1], events_a)),
+                 threading.Thread(target=scan_on, args=("b", clients[0], events_b))]
+        for thread in scans:
+            thread.start()
+        for thread in scans:
+            thread.join()
+        locks = {node.name: node.request("/stats")["cluster"]["verify_lock"] for node in nodes}
+        outcomes = sorted(str(log) for log in logs.values())
+        acquired = sum(lock["acquired"] for lock in locks.values())
+        if outcomes not in (["already", "queued"], ["already", "logged"]) or acquired != 1:
+            failures.append(f"lock contention: expected one logged and one 'already', got {logs}")
+        print(f"2. lock contention: verified log per node {logs}, locks {locks}")
+    finally:
+        for sio in clients:
+            sio.disconnect()
+        for node in nodes:
+            node.stop()
+        hub.terminate()
+        hub.wait(10)
+        if args.keep or failures:
+            print(f"Database and logs in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+import ocr
+
+MEDICINE_CLASS = 0
+FACE_CLASS = 1
+
+MEDICINE_COLOR = (0, 255, 0) # Green box for medicine
+FACE_COLOR = (255, 0, 0)     # Blue box for face
+
+# buf is the raw JPEG (bytes, memoryview or uint8 array), run_ocr asks for the medicine crops,
+# label is the display_name drawn above the medicine box, annotate=False skips drawing and encoding
+# for clients that draw the overlay themselves, detections (from the tracker) skip the detector,
+# ocr_cache is the session's OcrSnapshot so crops that were read before are answered straight away
+FrameJob = namedtuple("FrameJob", "buf run_ocr label annotate detections ocr_cache", defaults=(True, None, None))
+# ok is False when the JPEG could not be decoded, ocr holds one OcrRead per medicine crop
+# (cache misses carry the crop for the OCR stage instead of texts),
+# size is the decoded (width, height) and jpeg is None when the job was not annotated
+FrameResult = namedtuple("FrameResult", "ok detections ocr jpeg size")
+# track_id is filled in by the session's IoUTracker
+Detection = namedtuple("Detection", "class_id box conf track_id", defaults=(None,))
+
+
+def decode_frame(buf):
+    '''Decode JPEG bytes into an OpenCV BGR image, None if it is empty or broken.'''
+    nparr = np.frombuffer(buf, np.uint8)
+    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if frame is None or frame.size == 0:
+        return None
+    return frame
+
+
+def detections_from_result(result):
+    detections = []
+    for box in result.boxes:
+        x1, y1, x2, y2 = map(int, box.xyxy[0])
+        detections.append(Detection(int(box.cls[0]), (x1, y1, x2, y2), float(box.conf[0])))
+    return detections
+
+
+def crop_box(frame, box):
+    x1, y1, x2, y2 = box
+    return frame[max(y1, 0):y2, max(x1, 0):x2]
+
+
+def read_crop(crop, ocr_cache=None):
+    '''
+    Answer a crop from the cache when a crop with a close enough fingerprint was read before,
+    otherwise hand the crop on so the OCR stage can read it.
+    '''
+    if crop.size == 0:
+        return ocr.OcrRead([], None, False, None)
+    fp = ocr.fingerprint(crop)
+    cached = ocr.lookup(ocr_cache, fp)
+    if cached is not None:
+        return ocr.OcrRead(list(cached), fp, True, None)
+    return ocr.OcrRead(None, fp, False, np.ascontiguousarray(crop))
+
+
+def annotate(frame, detections, label):
+    annotated_frame = frame.copy() # Start with a clean frame
+    for det in detections:
+        x1, y1, x2, y2 = det.box
+        if det.class_id == MEDICINE_CLASS:
+            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), MEDICINE_COLOR, 3)
+            # Draw the label above the bottle
+            cv2.putText(annotated_frame, f"MEDICINE: {label}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 3, MEDICINE_COLOR, 3)
+        elif det.class_id == FACE_CLASS:
+            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), FACE_COLOR, 3)
+            cv2.putText(annotated_frame, "FACE", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 3, FACE_COLOR, 3)
+    return annotated_frame
+
+
+def encode_jpeg(frame, scale=4):
+    '''Shrink the frame for display and encode it, None if the encode failed.'''
+    h, w = frame.shape[:2]
+    resized_frame = cv2.resize(frame, (int(w / scale), int(h / scale)))
+    success, buffer = cv2.imencode(".jpg", resized_frame)
+    if not success:
+        return None
+    return buffer.tobytes()
+
+
+def _timed(timings, stage, start):
+    if timings is not None:
+        timings.setdefault(stage, []).append((time.perf_counter() - start) * 1000)
+
+
+def run_frames(detector, jobs, conf=0.5, timings=None):
+    '''
+    Full per-frame pipeline for a batch of jobs: decode, one batched detect, crop, annotate, encode.
+    detector is any engine from engines.py (ultralytics on PyTorch or ONNX Runtime).
+    Jobs that already carry tracked detections skip the predict. OCR itself runs later in the
+    OcrStage so the frame reply never waits on it.
+    Used inline on the server and inside the inference worker processes.
+    timings, when given, is a dict that collects milliseconds per stage (see bench_vision.py),
+    one entry per frame and one per batch for predict.
+    '''
+    frames = []
+    for job in jobs:
+        start = time.perf_counter()
+        frames.append(decode_frame(job.buf))
+        _timed(timings, "decode", start)
+    to_detect = [frame for job, frame in zip(jobs, frames) if frame is not None and job.detections is None]
+    start = time.perf_counter()
+    predictions = iter(detector.detect(to_detect, conf=conf) if to_detect else [])
+    if to_detect:
+        _timed(timings, "predict", start)
+
+    results = []
+    for job, frame in zip(jobs, frames):
+        if frame is None:
+            results.append(FrameResult(False, [], [], None, None))
+            continue
+        if job.detections is None:
+            detections = next(predictions)
+        else:
+            detections = job.detections
+        reads = []
+        if job.run_ocr:
+            start = time.perf_counter()
+            for det in detections:
+                if det.class_id == MEDICINE_CLASS:
+                    reads.append(read_crop(crop_box(frame, det.box), job.ocr_cache))
+            _timed(timings, "crop", start)
+        jpeg = None
+        if job.annotate:
+            start = time.perf_counter()
+            annotated = annotate(frame, detections, job.label)
+            _timed(timings, "annotate", start)
+            start = time.perf_counter()
+            jpeg = encode_jpeg(annotated)
+            _timed(timings, "encode", start)
+        h, w = frame.shape[:2]
+        results.append(FrameResult(True, detections, reads, jpeg, (w, h)))
+    return results
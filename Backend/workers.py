@@ -0,0 +1,306 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+from vision import FrameResult
+
+log = logging.getLogger("medaware.workers")
+
+try:
+    from gevent.socket import wait_read
+except ImportError: # plain threads, a blocking recv is fine there
+    wait_read = None
+
+
+def _worker_main(requests, replies, shm_name, engine, model_path, engine_options, ocr_gpu, conf, ocr_mode, ocr_height,
+                 warmup_frames, ocr_options, log_level="INFO"):
+    '''
+    Runs in its own process. Models are loaded once here, then every job batch is read
+    straight out of the shared memory block and the annotated JPEGs are written back into it.
+    With warmup_frames the models run on dummy input before the worker reports ready.
+    OCR requests from the OcrStage carry their (small) crops over the pipe.
+    '''
+    import engines
+    import ocr
+    import telemetry
+    import vision
+
+    telemetry.setup_logging(log_level) # same leveled, rate limited medaware logger as the server
+
+    # The server owns and unlinks the block, spawned children share its resource tracker
+    shm = shared_memory.SharedMemory(name=shm_name)
+
+    reader = ocr.load_reader(ocr_gpu, **ocr_options)
+    detector = engines.load_detector(engine, model_path, **engine_options)
+    if warmup_frames:
+        engines.warm_up(detector, warmup_frames)
+        ocr.warm_up(reader, mode=ocr_mode, height=ocr_height)
+    replies.send("ready")
+
+    while True:
+        msg = requests.recv()
+        if msg is None:
+            break
+        if msg[0] == "ocr":
+            try:
+                replies.send(("ok", ocr.read_batch(reader, msg[1], mode=ocr_mode, height=ocr_height)))
+            except Exception as e:
+                replies.send(("error", repr(e)))
+            continue
+
+        _, specs, inline = msg
+        jobs = []
+        for (offset, length, job), payload in zip(specs, inline):
+            buf = payload if payload is not None else shm.buf[offset:offset + length]
+            jobs.append(job._replace(buf=buf))
+
+        timings = {} # per stage, sent back for the server's /metrics
+        try:
+            results = vision.run_frames(detector, jobs, conf=conf, timings=timings)
+        except Exception as e:
+            replies.send(("error", repr(e)))
+            continue
+
+        # Write the annotated frames back into the same block, the inputs are decoded already
+        out, offset = [], 0
+        for res in results:
+            jpeg = res.jpeg
+            if jpeg is not None and offset + len(jpeg) <= shm.size:
+                shm.buf[offset:offset + len(jpeg)] = jpeg
+                out.append((res.ok, res.detections, res.ocr, (offset, len(jpeg)), None, res.size))
+                offset += len(jpeg)
+            else:
+                out.append((res.ok, res.detections, res.ocr, None, jpeg, res.size))
+        replies.send(("ok", out, timings))
+
+    jobs = buf = None # drop the views into the block so it can be closed
+    shm.close()
+
+
+class _Worker:
+    __slots__ = ("process", "requests", "replies", "shm")
+
+    def __init__(self, process, requests, replies, shm):
+        self.process = process
+        self.requests = requests
+        self.replies = replies
+        self.shm = shm
+
+
+class InferencePool:
+    '''
+    N worker processes, each with its own detector (see engines.py) + EasyOCR and one shared memory block.
+    run() hands a batch of FrameJobs to a free worker and waits for the reply without
+    blocking the gevent hub, so the socket loop only does I/O.
+
+    If a worker cannot load its models, start() raises, and so does every later run(). The
+    caller answers its frame with an error instead of waiting for a worker that will never
+    come. A worker that dies later is replaced in the background. Until the replacement is
+    ready, the pool runs one worker short. When none are left, run() raises.
+    '''
+
+    def __init__(self, workers=2, model_path="custom.pt", ocr_gpu=True, conf=0.5, shm_bytes=16 * 1024 * 1024,
+                 ocr_mode="detect", ocr_height=96, engine="torch", engine_options=None, warmup_frames=1,
+                 ocr_options=None, log_level="INFO", spawn=None):
+        self.size = max(1, int(workers))
+        self.engine = engine
+        self.model_path = model_path
+        self.engine_options = engine_options or {}
+        self.warmup_frames = warmup_frames
+        self.startup_ms = None # spawn + model load + warm-up, until every worker is ready
+        self.ocr_gpu = ocr_gpu
+        self.ocr_options = ocr_options or {} # extra ocr.load_reader arguments, e.g. the stub reader
+        self.log_level = log_level
+        self.ocr_mode = ocr_mode
+        self.ocr_height = ocr_height
+        self.conf = conf
+        self.shm_bytes = shm_bytes
+        self._spawn_task = spawn # runs the replacement of a dead worker, e.g. socketio.start_background_task
+        self._workers = []
+        self._idle = queue.Queue() # free workers, None once there are none left at all
+        self._start_lock = threading.Lock() # run() calls during start-up wait for it
+        self._started = False
+        self.error = None # why the pool cannot serve, start-up failure or every worker gone
+        self.respawns = 0
+
+    def _spawn(self):
+        # spawn, not fork: the server process is monkey patched and may hold CUDA state
+        ctx = multiprocessing.get_context("spawn")
+        shm = shared_memory.SharedMemory(create=True, size=self.shm_bytes)
+        # Two plain one-way pipes: a duplex Pipe is a socketpair, which gevent makes non-blocking
+        requests_in, requests_out = ctx.Pipe(duplex=False)
+        replies_in, replies_out = ctx.Pipe(duplex=False)
+        process = ctx.Process(
+            target=_worker_main,
+            args=(requests_in, replies_out, shm.name, self.engine, self.model_path, self.engine_options,
+                  self.ocr_gpu, self.conf, self.ocr_mode, self.ocr_height, self.warmup_frames,
+                  self.ocr_options, self.log_level),
+            daemon=True,
+        )
+        process.start()
+        requests_in.close()
+        replies_out.close()
+        worker = _Worker(process, requests_out, replies_in, shm)
+        self._workers.append(worker)
+        return worker
+
+    def _ready(self, worker):
+        # A worker that fails to load its models exits, which reads as EOFError here
+        try:
+            reply = self._recv(worker)
+        except (EOFError, OSError):
+            reply = None
+        if reply != "ready":
+            worker.process.join(timeout=5)
+            raise RuntimeError(f"Inference worker exited while loading its models (exit code {worker.process.exitcode})")
+
+    def _discard(self, worker):
+        if worker in self._workers:
+            self._workers.remove(worker)
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(timeout=5)
+        worker.requests.close()
+        worker.replies.close()
+        worker.shm.close()
+        worker.shm.unlink()
+
+    def start(self):
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            if self.error is not None:
+                raise RuntimeError(f"Inference workers unavailable: {self.error}")
+            started = time.monotonic()
+            try:
+                for _ in range(self.size):
+                    self._spawn()
+                for worker in self._workers:
+                    self._ready(worker)
+            except Exception as e:
+                self.error = str(e)
+                for worker in list(self._workers):
+                    self._discard(worker)
+                raise
+            for worker in self._workers:
+                self._idle.put(worker)
+            self.startup_ms = round((time.monotonic() - started) * 1000, 1)
+            self._started = True
+        log.info("%s inference workers ready in %sms", self.size, self.startup_ms)
+
+    def _recv(self, worker):
+        if wait_read is not None:
+            wait_read(worker.replies.fileno()) # yield to the hub until the worker answers
+        return worker.replies.recv()
+
+    def _checkout(self):
+        self.start()
+        worker = self._idle.get()
+        if worker is None:
+            self._idle.put(None) # for the next caller
+            raise RuntimeError(f"Inference workers unavailable: {self.error}")
+        return worker
+
+    def _checkin(self, worker, dead):
+        if not dead:
+            self._idle.put(worker)
+            return
+        log.error("Inference worker %s died (exit code %s), starting another", worker.process.pid, worker.process.exitcode)
+        self._discard(worker)
+        if self._spawn_task is None:
+            threading.Thread(target=self._replace, daemon=True).start()
+        else:
+            self._spawn_task(self._replace)
+
+    def _replace(self):
+        worker = None
+        try:
+            worker = self._spawn()
+            self._ready(worker)
+        except Exception as e:
+            if worker is not None:
+                self._discard(worker)
+            log.error("Could not replace the inference worker : %s", e)
+            if not self._workers:
+                self.error = str(e)
+                self._idle.put(None) # wakes every caller waiting for a worker, see _checkout
+            return
+        self.respawns += 1
+        self._idle.put(worker)
+
+    def run(self, jobs, timings=None):
+        '''Same contract as vision.run_frames, but executed in a worker process.'''
+        worker = self._checkout()
+        dead = False
+        try:
+            specs, inline, offset = [], [], 0
+            for job in jobs:
+                length = len(job.buf)
+                if offset + length <= worker.shm.size:
+                    worker.shm.buf[offset:offset + length] = job.buf
+                    specs.append((offset, length, job._replace(buf=None)))
+                    inline.append(None)
+                    offset += length
+                else:
+                    # Does not fit in the block, send it over the pipe instead
+                    specs.append((0, length, job._replace(buf=None)))
+                    inline.append(bytes(job.buf))
+            try:
+                worker.requests.send(("frames", specs, inline))
+                reply = self._recv(worker)
+            except (EOFError, OSError) as e:
+                dead = True
+                raise RuntimeError("Inference worker died") from e
+            status, payload = reply[0], reply[1]
+            if status != "ok":
+                raise RuntimeError(f"Inference worker error: {payload}")
+            if timings is not None:
+                for stage, values in reply[2].items():
+                    timings.setdefault(stage, []).extend(values)
+
+            results = []
+            for ok, detections, reads, location, jpeg, size in payload:
+                if location is not None:
+                    start, length = location
+                    jpeg = bytes(worker.shm.buf[start:start + length])
+                results.append(FrameResult(ok, detections, reads, jpeg, size))
+            return results
+        finally:
+            self._checkin(worker, dead)
+
+    def read_text(self, crops):
+        '''OcrStage read_fn: one list of texts per crop, read by a worker's EasyOCR in one batch.'''
+        worker = self._checkout()
+        dead = False
+        try:
+            try:
+                worker.requests.send(("ocr", crops))
+                status, payload = self._recv(worker)
+            except (EOFError, OSError) as e:
+                dead = True
+                raise RuntimeError("Inference worker died") from e
+            if status != "ok":
+                raise RuntimeError(f"Inference worker error: {payload}")
+            return payload
+        finally:
+            self._checkin(worker, dead)
+
+    def stats(self):
+        return {"workers": len(self._workers), "idle": self._idle.qsize(), "respawns": self.respawns, "error": self.error}
+
+    def close(self):
+        for worker in self._workers:
+            try:
+                worker.requests.send(None)
+            except OSError:
+                pass
+            worker.process.join(timeout=5)
+            worker.shm.close()
+            worker.shm.unlink()
+        self._workers = []
+        self._started = False
@@ -2,7 +2,7 @@ import { Ionicons } from '@expo/vector-icons';
 import AsyncStorage from '@react-native-async-storage/async-storage';
 import { LinearGradient } from 'expo-linear-gradient';
 import { useFocusEffect, useRouter } from 'expo-router';
-import React, { useCallback, useEffect, useState } from 'react';
+import React, { useCallback, useEffect, useRef, useState } from 'react';
 import { BlurView } from 'expo-blur';
 import {
   Alert,
@@ -35,6 +35,13 @@ interface NotificationService {
 
 declare const NotificationService: NotificationService;
 
+// /get_schedule: every reminder with its medicines nested inside
+type ScheduleReminder = {
+  rid: number;
+  rtime: string | null;
+  medicines: { mid: number; mname: string; dose_qty: number; total_qty: number }[];
+};
+
 export default function HomeScreen() {
   const [medicines, setMedicines] = useState<Medicine[]>([]);
   const [loading, setLoading] = useState<boolean>(true);
@@ -42,6 +49,8 @@ export default function HomeScreen() {
   const [showAlarm, setShowAlarm] = useState<boolean>(false);
   const [alarmMedicineName, setAlarmMedicineName] = useState<string>('');
   const router = useRouter();
+  // Last schedule and its ETag, an unchanged schedule comes back as an empty 304
+  const scheduleRef = useRef<{ etag: string | null; medicines: Medicine[] }>({ etag: null, medicines: [] });
 
   // Dynamic greeting
   const getGreeting = (): string => {
@@ -58,41 +67,32 @@ export default function HomeScreen() {
       
       // TRY BACKEND FIRST
       try {
-        const remindersRes = await fetch('http://10.203.52.34:8080/get_reminders', {
+        const uid = await AsyncStorage.getItem('uid');
+        const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+        if (scheduleRef.current.etag) headers['If-None-Match'] = scheduleRef.current.etag;
+
+        const scheduleRes = await fetch(`http://10.203.52.34:8080/get_schedule?uid=${uid ?? ''}`, {
           method: 'GET',
           credentials: 'include',
-          headers: { 'Content-Type': 'application/json' },
+          headers,
         });
-        
-        if (remindersRes.ok) {
-          const reminders = await remindersRes.json() as any[];
-          let allMeds: Medicine[] = [];
-          
-          for (const r of reminders) {
-            try {
-              const medsRes = await fetch('http://10.203.52.34:8080/get_medicines', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                credentials: 'include',
-                body: JSON.stringify({ rid: r.rid }),
-              });
-              
-              if (medsRes.ok) {
-                const meds = await medsRes.json() as any[];
-                const mappedMeds = meds.map((m: any): Medicine => ({
-                  id: m.mid?.toString() || Date.now().toString(),
-                  name: m.mname || 'Unknown',
-                  dosage: m.dose_qty?.toString() || '1',
-                  totalDosage: m.total_qty?.toString() || '30',
-                  time: r.rtime || new Date().toISOString(),
-                }));
-                allMeds.push(...mappedMeds);
-              }
-            } catch (medError) {
-              console.log('⚠️ Medicine fetch failed:', medError);
-            }
-          }
-          
+
+        if (scheduleRes.status === 304 && scheduleRef.current.medicines.length > 0) {
+          setMedicines(scheduleRef.current.medicines);
+          return;
+        }
+
+        if (scheduleRes.ok) {
+          const reminders = await scheduleRes.json() as ScheduleReminder[];
+          const allMeds = reminders.flatMap(r => r.medicines.map((m): Medicine => ({
+            id: m.mid?.toString() || Date.now().toString(),
+            name: m.mname || 'Unknown',
+            dosage: m.dose_qty?.toString() || '1',
+            totalDosage: m.total_qty?.toString() || '30',
+            time: r.rtime || new Date().toISOString(),
+          })));
+          scheduleRef.current = { etag: scheduleRes.headers.get('ETag'), medicines: allMeds };
+
           if (allMeds.length > 0) {
             setMedicines(allMeds);
             return;
@@ -17,6 +17,7 @@ import AsyncStorage from '@react-native-async-storage/async-storage';
 import { LinearGradient } from 'expo-linear-gradient';
 import { useRouter } from 'expo-router';
 import CustomButton from '../../components/CustomButton';
+import { identify } from '../../lib/socket';
 
 type IoniconName = ComponentProps<typeof Ionicons>['name'];
 
@@ -69,6 +70,7 @@ export default function ProfileScreen() {
  const handleLogout = async () => {
   try {
     await AsyncStorage.multiRemove(['uid', 'isLoggedIn', 'userToken', 'userData']);
+    identify(null);
     Alert.alert('Logged Out', 'Come back anytime!', [
       { text: 'OK', onPress: () => router.replace('/') } // force back to login
     ]);
@@ -4,6 +4,7 @@ import AsyncStorage from '@react-native-async-storage/async-storage';
 import * as Notifications from 'expo-notifications';
 import { View, ActivityIndicator, Text } from 'react-native';
 import { MedicineProvider } from '../lib/MedicineContext';
+import '../lib/socket'; // connects with the stored uid so reminder pushes reach every screen
 
 export default function RootLayout() {
   const router = useRouter();
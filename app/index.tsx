@@ -11,6 +11,7 @@ import CustomInput from '../components/CustomInput';
 import CustomButton from '../components/CustomButton';
 import { COLORS } from '../utils/theme';
 import NotificationService from '../lib/NotificationService';
+import { identify } from '../lib/socket';
 
 type LoginData = { 
   email: string; 
@@ -68,13 +69,14 @@ export default function LoginScreen() {
       const data = await response.json();  // ✅ Direct JSON - Backend fixed
       console.log('✅ STATUS:', response.status, 'DATA:', data);
 
-      if (data.success) {
+      if (data.success && data.uid != null) {
         // ✅ Backend returns uid + success
         await AsyncStorage.multiSet([
           ['isLoggedIn', 'true'],
-          ['uid', data.uid?.toString() || '1'],
+          ['uid', data.uid.toString()],
           ['email', formData.email]
         ]);
+        identify(data.uid);  // ✅ Server can push reminders to this socket now
         Alert.alert('✅ Success', data.message || 'Logged in successfully!');
         router.replace('/(tabs)/home');
       } else {
@@ -17,6 +17,7 @@ import {
 import CustomButton from '../components/CustomButton';
 import CustomInput from '../components/CustomInput';
 import { COLORS } from '../utils/theme';
+import { identify } from '../lib/socket';
 
 type FormData = {
   email: string;
@@ -96,12 +97,13 @@ export default function RegisterScreen() {
       const data = await response.json();  // ✅ Direct JSON
       console.log('✅ REGISTER STATUS:', response.status, 'DATA:', data);
 
-      if (data.success) {
+      if (data.success && data.uid != null) {
         await AsyncStorage.multiSet([
           ['isLoggedIn', 'true'],
-          ['uid', data.uid?.toString() || '1'],
+          ['uid', data.uid.toString()],
           ['email', formData.email]
         ]);
+        identify(data.uid);  // ✅ Server can push reminders to this socket now
         Alert.alert('✅ Success', data.message || 'Account created!');
         router.replace('/(tabs)/home');
       } else {
@@ -1,5 +1,6 @@
 import AsyncStorage from '@react-native-async-storage/async-storage';
 import { CameraView, useCameraPermissions } from 'expo-camera';
+import { File } from 'expo-file-system';
 import { useLocalSearchParams, useRouter } from 'expo-router';
 import React, { useCallback, useEffect, useRef, useState } from 'react';
 import {
@@ -20,6 +21,24 @@ const CAMERA_SIZE = Math.min(width * 0.85, 360);
 
 type Medicine = { id: string; name: string; reminderId?: string };
 
+// Compact payload sent instead of annotated_frame when the socket asks for overlay: 'metadata'
+type FrameDetections = {
+  boxes: [number, number, number, number][]; // x1, y1, x2, y2 normalised to 0..1
+  classes: number[]; // 0 = medicine, 1 = face
+  scores: number[];
+  display_name: string;
+  verified: boolean;
+};
+
+// Pacing the server asks for, based on how long our frames take and how busy it is
+type CaptureHint = {
+  interval_ms: number;
+  quality: number; // 0..1, passed straight to takePictureAsync
+  max_dimension: number;
+};
+
+const DEFAULT_HINT: CaptureHint = { interval_ms: 1000, quality: 0.3, max_dimension: 400 };
+
 export default function CameraVerification() {
   const router = useRouter();
   const params = useLocalSearchParams();
@@ -36,19 +55,22 @@ export default function CameraVerification() {
   const [verified, setVerified] = useState(false);
   const [showOverlay, setShowOverlay] = useState(false);
   const [overlayImage, setOverlayImage] = useState<string | null>(null);
+  const [detections, setDetections] = useState<FrameDetections | null>(null);
 
   const frameCountRef = useRef(0);
   const frameIntervalRef = useRef<NodeJS.Timeout | null>(null);
   const timeoutIntervalRef = useRef<NodeJS.Timeout | null>(null);
   const isCapturingRef = useRef(false);
   const isActiveRef = useRef(false);
+  const captureHintRef = useRef<CaptureHint>(DEFAULT_HINT);
+  const backoffUntilRef = useRef(0); // set when the server drops a frame because it is overloaded
 
   /** 🔥 TOTAL KILL SWITCH */
   const emergencyStop = useCallback(() => {
     console.log('🛑 EMERGENCY STOP ACTIVATED');
     
     if (frameIntervalRef.current) {
-      clearInterval(frameIntervalRef.current);
+      clearTimeout(frameIntervalRef.current);
       frameIntervalRef.current = null;
     }
     if (timeoutIntervalRef.current) {
@@ -61,6 +83,7 @@ export default function CameraVerification() {
     setIsVerifying(false);
     setShowOverlay(false);
     setOverlayImage(null);
+    setDetections(null);
     frameCountRef.current = 0;
   }, []);
 
@@ -73,17 +96,18 @@ export default function CameraVerification() {
     isCapturingRef.current = true;
     try {
       const photo = await cameraRef.current.takePictureAsync({
-        quality: 0.3,
-        base64: true,
+        quality: captureHintRef.current.quality,
         skipProcessing: true,
-        maxDimension: 400,
+        maxDimension: captureHintRef.current.max_dimension,
       });
 
-      if (photo?.base64 && uid && medicine?.reminderId) {
+      if (photo?.uri && uid && medicine?.reminderId) {
+        // The JPEG goes up as a binary attachment (frame_protocol 'binary'), a third smaller than base64 and nothing to decode on the server
+        const jpeg = await new File(photo.uri).bytes();
         socket.emit("raw_frame", {
           uid: uid,
           rid: Number(medicine.reminderId),
-          frame: photo.base64,
+          frame: jpeg,
         });
         frameCountRef.current += 1;
         console.log(`📤 Frame #${frameCountRef.current}`);
@@ -100,9 +124,19 @@ export default function CameraVerification() {
     console.log('🚀 CONTINUOUS CAPTURE STARTED');
     isActiveRef.current = true;
     frameCountRef.current = 0;
-    
-    frameIntervalRef.current = setInterval(captureAndSend, 1000);
-    captureAndSend();
+
+    // Re-armed after every frame so a new capture_hint interval applies right away
+    const scheduleNext = () => {
+      if (!isActiveRef.current) return;
+      const backoff = Math.max(0, backoffUntilRef.current - Date.now());
+      const delay = Math.max(captureHintRef.current.interval_ms, backoff);
+      frameIntervalRef.current = setTimeout(async () => {
+        await captureAndSend();
+        scheduleNext();
+      }, delay);
+    };
+
+    captureAndSend().then(scheduleNext);
   }, [uid, medicine]);
 
   /** 🔥 PERFECT SOCKET HANDLERS */
@@ -147,6 +181,21 @@ export default function CameraVerification() {
       }
     };
 
+    const handleFrameDetections = (data: FrameDetections) => {
+      if (!data?.boxes) return;
+      setDetections(data);
+    };
+
+    const handleCaptureHint = (hint: CaptureHint) => {
+      if (!hint?.interval_ms) return;
+      console.log(`⏱️ Capture hint: ${hint.interval_ms}ms q=${hint.quality} max=${hint.max_dimension}`);
+      captureHintRef.current = hint;
+    };
+
+    const handleFrameDropped = (data: { retry_after_ms?: number }) => {
+      backoffUntilRef.current = Date.now() + (data?.retry_after_ms ?? 1000);
+    };
+
     const handleVerified = (data: any) => {
       console.log("🎉 🔥 AI VERIFIED!");
       setVerified(true);
@@ -157,10 +206,16 @@ export default function CameraVerification() {
 
     console.log("🔌 Socket listeners registered");
     socket.on('annotated_frame', handleAnnotatedFrame);
+    socket.on('frame_detections', handleFrameDetections);
+    socket.on('capture_hint', handleCaptureHint);
+    socket.on('frame_dropped', handleFrameDropped);
     socket.on('verified', handleVerified);
 
     return () => {
       socket.off('annotated_frame', handleAnnotatedFrame);
+      socket.off('frame_detections', handleFrameDetections);
+      socket.off('capture_hint', handleCaptureHint);
+      socket.off('frame_dropped', handleFrameDropped);
       socket.off('verified', handleVerified);
     };
   }, [emergencyStop, router]);
@@ -176,6 +231,7 @@ export default function CameraVerification() {
     setIsVerifying(true);
     setShowOverlay(false);
     setOverlayImage(null);
+    setDetections(null);
     startCapture();
   }, [startCapture, medicine, uid]);
 
@@ -257,6 +313,31 @@ export default function CameraVerification() {
             </View>
           )}
           
+          {/* 3b. CLIENT-DRAWN BOXES (overlay: 'metadata') */}
+          {detections?.boxes.map(([x1, y1, x2, y2], i) => {
+            const isMedicine = detections.classes[i] === 0;
+            return (
+              <View
+                key={i}
+                style={[
+                  styles.detectionBox,
+                  {
+                    // Front camera preview is mirrored, the captured frame is not
+                    left: (1 - x2) * CAMERA_SIZE,
+                    top: y1 * CAMERA_SIZE,
+                    width: (x2 - x1) * CAMERA_SIZE,
+                    height: (y2 - y1) * CAMERA_SIZE,
+                    borderColor: isMedicine ? '#10B981' : '#3B82F6',
+                  },
+                ]}
+              >
+                <Text style={[styles.detectionLabel, { backgroundColor: isMedicine ? '#10B981' : '#3B82F6' }]}>
+                  {isMedicine ? `MEDICINE: ${detections.display_name}` : 'FACE'}
+                </Text>
+              </View>
+            );
+          })}
+
           {/* 4. FOCUS RING - TOPMOST */}
           <View style={styles.focusRing} />
         </View>
@@ -353,6 +434,21 @@ const styles = StyleSheet.create({
     fontSize: 12,
     fontWeight: 'bold',
   },
+  detectionBox: {
+    position: 'absolute',
+    borderWidth: 2,
+    borderRadius: 6,
+    zIndex: 12,
+  },
+  detectionLabel: {
+    position: 'absolute',
+    top: -18,
+    left: -2,
+    color: 'white',
+    fontSize: 10,
+    fontWeight: 'bold',
+    paddingHorizontal: 4,
+  },
   focusRing: {
     ...StyleSheet.absoluteFillObject,
     borderWidth: 3,
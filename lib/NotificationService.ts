@@ -95,6 +95,36 @@ class NotificationService {
     });
   }
 
+  // 🔔 Ring now for a reminder the server says is due (unless our own alarm is already showing)
+  static async alarmNow(reminderId: string) {
+    const presented = await Notifications.getPresentedNotificationsAsync();
+    if (presented.some((n) => String((n.request.content.data as any)?.reminderId) === reminderId)) return;
+
+    const medicines = await this.getMedicines();
+    const med = medicines.find((m) => String(m.reminderId) === reminderId);
+
+    await Notifications.scheduleNotificationAsync({
+      content: {
+        title: '🚨 MEDICINE ALARM',
+        body: med ? `Take ${med.name} - ${med.dosage}` : 'Time to take your medicine',
+        sound: 'default',
+        priority: Notifications.AndroidNotificationPriority.MAX,
+        data: {
+          medicineId: med?.id,
+          reminderId : reminderId,
+        },
+      },
+      trigger: null, // right away
+    });
+  }
+
+  // ⚠️ The server logged the dose as Missed, keep the local history in step
+  static async markMissed(reminderId: string) {
+    const medicines = await this.getMedicines();
+    const med = medicines.find((m) => String(m.reminderId) === reminderId);
+    if (med) await this.addToHistory(med.id, 'missed');
+  }
+
   // 🛑 Stop alarm completely
   static async stopAlarm() {
     await Notifications.cancelAllScheduledNotificationsAsync();
@@ -1,4 +1,6 @@
 import { io } from "socket.io-client";
+import AsyncStorage from '@react-native-async-storage/async-storage';
+import NotificationService from './NotificationService';
 
 export const socket = io("http://10.203.52.34:8080", {
   withCredentials: true,           // ← Sends login session
@@ -7,6 +9,8 @@ export const socket = io("http://10.203.52.34:8080", {
   reconnectionDelay: 1000,
   reconnection: true,
   reconnectionAttempts: 5,
+  auth: { overlay: 'metadata', frame_protocol: 'binary' }, // ← Server sends boxes, we draw them (no annotated JPEG); frames go up as raw JPEG bytes
+  autoConnect: false,              // ← identify() connects once the uid is known
 });
 
 socket.on("connect", () => {
@@ -20,4 +24,23 @@ socket.on("success", (data) => {
 
 socket.on("app_error",(data)=>{
    console.log(data.message);
-})
\ No newline at end of file
+})
+
+// 🔔 The server schedules reminders too, so a dose rings and gets its Missed log even if this phone never scheduled it
+socket.on("reminder_due", (data) => {
+  console.log("🔔 Reminder due:", data);
+  NotificationService.alarmNow(String(data.rid));
+});
+
+socket.on("reminder_missed", (data) => {
+  console.log("⚠️ Dose missed:", data);
+  NotificationService.markMissed(String(data.rid));
+});
+
+// The server takes the user from the login cookie sent with the handshake, so the socket connects again on login / logout
+export function identify(uid: string | number | null) {
+  socket.disconnect();
+  if (uid != null) socket.connect();
+}
+
+AsyncStorage.getItem('uid').then(identify);